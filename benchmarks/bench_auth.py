@@ -0,0 +1,51 @@
+import datetime
+import hashlib
+import timeit
+from argparse import ArgumentParser
+
+from src.api_requests import ADMIN_LOGIN, ADMIN_SALT, SALT, check_auth
+
+
+def legacy_check_auth(request_data):
+    body = request_data.get('body', {})
+    if body.get('login') == ADMIN_LOGIN:
+        digest = hashlib.sha512(
+            (datetime.datetime.now().strftime("%Y%m%d%H") + ADMIN_SALT).encode('utf-8')
+        ).hexdigest()
+    else:
+        digest = hashlib.sha512(
+            (body.get('account', '') + body.get('login', '') + SALT).encode('utf-8')
+        ).hexdigest()
+    return digest == body.get('token')
+
+
+def make_requests():
+    user = {"account": "horns&hoofs", "login": "h&f"}
+    user["token"] = hashlib.sha512(
+        (user["account"] + user["login"] + SALT).encode('utf-8')
+    ).hexdigest()
+    admin = {"account": "horns&hoofs", "login": ADMIN_LOGIN}
+    admin["token"] = hashlib.sha512(
+        (datetime.datetime.now().strftime("%Y%m%d%H") + ADMIN_SALT).encode('utf-8')
+    ).hexdigest()
+    return {"user": {"body": user}, "admin": {"body": admin}}
+
+
+def main():
+    parser = ArgumentParser(
+        description='Per-request auth cost, legacy vs cached digests'
+    )
+    parser.add_argument('-n', '--number', type=int, default=100000)
+    args = parser.parse_args()
+
+    for name, request in make_requests().items():
+        assert legacy_check_auth(request) and check_auth(request)
+        for impl_name, impl in (("legacy", legacy_check_auth), ("cached", check_auth)):
+            seconds = timeit.timeit(lambda: impl(request), number=args.number)
+            print(
+                f"{name:>5} {impl_name:>6}: {seconds / args.number * 1e6:.2f} us/call"
+            )
+
+
+if __name__ == '__main__':
+    main()
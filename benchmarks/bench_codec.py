@@ -0,0 +1,43 @@
+import random
+import timeit
+from argparse import ArgumentParser
+
+from src import codec
+from src.handlers import make_envelope, OK
+from src.scoring_service import DEFAULT_INTERESTS
+
+
+def make_payloads(clients):
+    rng = random.Random(0)
+    interests = {str(cid): rng.sample(DEFAULT_INTERESTS, 2) for cid in range(clients)}
+    arguments = {"client_ids": list(range(clients)), "date": "20.07.2017"}
+    request = {"body": {"account": "horns&hoofs", "login": "h&f",
+                        "method": "clients_interests", "token": "0" * 128,
+                        "arguments": arguments}}
+    return request, make_envelope(interests, OK)
+
+
+def main():
+    parser = ArgumentParser(
+        description='JSON codec backends on clients_interests payloads')
+    parser.add_argument('--clients', type=int, nargs='+', default=[10, 1000, 10000])
+    parser.add_argument('-n', '--number', type=int, default=200)
+    args = parser.parse_args()
+
+    for clients in args.clients:
+        request, response = make_payloads(clients)
+        for name in codec.available():
+            loads, dumps = codec.get(name)
+            raw_request = dumps(request)
+            decode = min(timeit.repeat(lambda: loads(raw_request),
+                                       number=args.number, repeat=3))
+            encode = min(timeit.repeat(lambda: dumps(response),
+                                       number=args.number, repeat=3))
+            decode_us = decode / args.number * 1e6
+            encode_us = encode / args.number * 1e6
+            print(f"clients={clients:>6} {name:>8}: decode {decode_us:9.1f} us, "
+                  f"encode {encode_us:9.1f} us, {len(dumps(response))} bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+import datetime
+import random
+import timeit
+from argparse import ArgumentParser
+
+from src.cache_keys import score_cache_key, legacy_score_cache_key
+
+
+FIRST_NAMES = ["Anna", "Ivan", "Konstantin", "Maria"]
+LAST_NAMES = ["Petrova", "Ivanov", "Konstantinopolsky", "Sidorova"]
+
+
+def make_identities(count):
+    rng = random.Random(0)
+    return [{"phone": f"7{rng.randrange(10 ** 10):010d}",
+             "email": f"user{n}.{rng.randrange(10 ** 6)}@example.com",
+             "birthday": datetime.date(rng.randrange(1960, 2000), rng.randrange(1, 13),
+                                       rng.randrange(1, 29)),
+             "gender": rng.randrange(3),
+             "first_name": rng.choice(FIRST_NAMES),
+             "last_name": rng.choice(LAST_NAMES)}
+            for n in range(count)]
+
+
+def main():
+    parser = ArgumentParser(
+        description='Score cache key size and build cost, legacy vs hashed keys')
+    parser.add_argument('--identities', type=int, default=100000)
+    args = parser.parse_args()
+
+    identities = make_identities(args.identities)
+    for name, key in (("legacy", legacy_score_cache_key), ("hashed", score_cache_key)):
+        elapsed = min(timeit.repeat(lambda: [key(**fields) for fields in identities],
+                                    number=1, repeat=3))
+        total = sum(len(f"cache:{key(**fields)}".encode('utf-8'))
+                    for fields in identities)
+        print(f"{name:>7}: {elapsed / len(identities) * 1e6:6.2f} us/key, "
+              f"avg {total / len(identities):6.1f} bytes/key, "
+              f"{total / 2 ** 20:8.2f} MiB of keys")
+
+
+if __name__ == '__main__':
+    main()
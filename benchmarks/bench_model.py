@@ -0,0 +1,31 @@
+import timeit
+from argparse import ArgumentParser
+
+from src.api_requests import ClientsInterestsRequest, OnlineScoreRequest
+
+CASES = {
+    "online_score/full": (OnlineScoreRequest, {
+        "phone": "79175002040", "email": "stupnikov@otus.ru", "gender": 1,
+        "birthday": "01.01.2000", "first_name": "a", "last_name": "b",
+    }),
+    "online_score/pair": (OnlineScoreRequest, {
+        "phone": "79175002040", "email": "stupnikov@otus.ru",
+    }),
+    "clients_interests/100": (ClientsInterestsRequest, {
+        "client_ids": list(range(100)), "date": "20.07.2017",
+    }),
+}
+
+
+def main():
+    parser = ArgumentParser(description='Request validation cost per request class')
+    parser.add_argument('-n', '--number', type=int, default=100000)
+    args = parser.parse_args()
+
+    for name, (request_class, arguments) in CASES.items():
+        seconds = timeit.timeit(lambda: request_class(arguments), number=args.number)
+        print(f"{name:>22}: {seconds / args.number * 1e6:.2f} us/request")
+
+
+if __name__ == '__main__':
+    main()
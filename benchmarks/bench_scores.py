@@ -0,0 +1,52 @@
+import datetime
+import random
+import timeit
+from argparse import ArgumentParser
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from src.scoring_service import compute_score, compute_scores, compute_scores_batch, \
+    score_columns
+
+
+def make_items(count):
+    rng = random.Random(0)
+    birthday = datetime.date(1990, 1, 1)
+    return [{"phone": rng.choice([None, "79175002040"]),
+             "email": rng.choice([None, "user@otus.ru"]),
+             "birthday": rng.choice([None, birthday]),
+             "gender": rng.choice([None, 0, 1, 2]),
+             "first_name": rng.choice([None, "a"]),
+             "last_name": rng.choice([None, "b"])}
+            for _ in range(count)]
+
+
+def main():
+    parser = ArgumentParser(
+        description='Per-record compute_score vs columnar compute_scores')
+    parser.add_argument('--items', type=int, nargs='+', default=[100, 10000, 1000000])
+    parser.add_argument('-n', '--number', type=int, default=5)
+    args = parser.parse_args()
+
+    for count in args.items:
+        items = make_items(count)
+        columns = score_columns(items)
+        cases = {"per-record": lambda: [compute_score(**fields) for fields in items],
+                 "columns/pure": lambda: compute_scores(**columns),
+                 "items": lambda: compute_scores_batch(items)}
+        if numpy is not None:
+            masks = {field: numpy.fromiter(map(bool, column), dtype=bool, count=count)
+                     for field, column in columns.items()}
+            cases["masks/numpy"] = lambda: compute_scores(**masks)
+
+        for name, fn in cases.items():
+            elapsed = min(timeit.repeat(fn, number=args.number, repeat=3)) / args.number
+            print(f"items={count:>8} {name:>14}: {elapsed * 1e3:9.3f} ms, "
+                  f"{elapsed / count * 1e9:7.1f} ns/item")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+from http.client import HTTPConnection, RemoteDisconnected
+
+from src.api_requests import SALT
+
+
+def score_body():
+    body = {"account": "horns&hoofs", "login": "h&f", "method": "online_score",
+            "arguments": {"phone": "79175002040", "email": "stupnikov@otus.ru"}}
+    secret = (body["account"] + body["login"] + SALT).encode('utf-8')
+    body["token"] = hashlib.sha512(secret).hexdigest()
+    return json.dumps({"body": body})
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_mb(pid):
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def first_request(port, body, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            conn = HTTPConnection("127.0.0.1", port, timeout=timeout)
+            conn.connect()
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.002)
+            continue
+        try:
+            started = time.perf_counter()
+            conn.request("POST", "/method", body)
+            response = conn.getresponse()
+            response.read()
+            return response.status, time.perf_counter() - started
+        except (ConnectionResetError, RemoteDisconnected):
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.002)
+        finally:
+            conn.close()
+
+
+def cold_start(server_args, body, timeout):
+    port = free_port()
+    started = time.perf_counter()
+    command = [sys.executable, "-m", "src", "-H", "127.0.0.1", "-p", str(port),
+               *server_args]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    try:
+        status, latency = first_request(port, body, timeout)
+        elapsed = time.perf_counter() - started
+        rss = rss_mb(process.pid)
+    finally:
+        process.terminate()
+        process.wait()
+    return elapsed, latency, rss, status
+
+
+def interpreter_start():
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = ArgumentParser(
+        description='Time-to-first-request and startup RSS of "python -m src"')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--store', choices=['memory', 'redis'], default='memory')
+    parser.add_argument('--redis-nodes', default='localhost:6379')
+    parser.add_argument('--timeout', type=float, default=10.0)
+    args = parser.parse_args()
+
+    body = score_body()
+    store_args = ['--store', args.store, '--redis-nodes', args.redis_nodes]
+    baseline = min(interpreter_start() for _ in range(args.runs))
+    print(f"{'python -c pass':>22}: {baseline * 1e3:7.1f} ms")
+    for name, extra in (("default", []), ("--preload", ["--preload"])):
+        runs = [cold_start(store_args + extra, body, args.timeout)
+                for _ in range(args.runs)]
+        times = [elapsed for elapsed, _, _, _ in runs]
+        took = statistics.median(r[1] for r in runs)
+        rss = statistics.median(r[2] for r in runs)
+        print(f"{args.store + ' ' + name:>22}: first request after "
+              f"{statistics.median(times) * 1e3:7.1f} ms median "
+              f"({min(times) * 1e3:.1f} min), took {took * 1e3:6.2f} ms, "
+              f"RSS {rss:5.1f} MB, status {runs[-1][3]}")
+
+
+if __name__ == '__main__':
+    main()
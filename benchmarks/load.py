@@ -0,0 +1,251 @@
+import datetime
+import hashlib
+import json
+import logging
+import platform
+import random
+import threading
+import time
+from argparse import ArgumentParser
+from http.client import HTTPConnection
+from urllib.parse import urlsplit
+
+import redis
+
+from benchmarks.memory_store import InMemoryStore
+from src.api_requests import ADMIN_LOGIN, ADMIN_SALT, SALT
+from src.handlers import MainHTTPHandler
+from src.server import make_server
+from src.storage import MemoryStore, ShardedStore, parse_node
+from src.store import Store
+
+DEFAULT_MIX = "online_score=70,clients_interests=20,admin=10"
+
+
+def user_token(account, login):
+    return hashlib.sha512((account + login + SALT).encode('utf-8')).hexdigest()
+
+
+def admin_token():
+    return hashlib.sha512(
+        (datetime.datetime.now().strftime("%Y%m%d%H") + ADMIN_SALT).encode('utf-8')
+    ).hexdigest()
+
+
+def online_score_body(rng, identities):
+    n = rng.randrange(identities)
+    return {"account": "horns&hoofs", "login": "h&f", "method": "online_score",
+            "token": user_token("horns&hoofs", "h&f"),
+            "arguments": {"phone": f"7{n:010d}", "email": f"user{n}@otus.ru",
+                          "first_name": "a", "last_name": "b"}}
+
+
+def clients_interests_body(rng, identities):
+    client_ids = rng.sample(range(identities), min(10, identities))
+    return {"account": "horns&hoofs", "login": "h&f", "method": "clients_interests",
+            "token": user_token("horns&hoofs", "h&f"),
+            "arguments": {"client_ids": client_ids, "date": "20.07.2017"}}
+
+
+def admin_body(rng, identities):
+    return {"account": "horns&hoofs", "login": ADMIN_LOGIN, "method": "online_score",
+            "token": admin_token(),
+            "arguments": {"phone": "79175002040", "email": "stupnikov@otus.ru"}}
+
+
+GENERATORS = {
+    "online_score": online_score_body,
+    "clients_interests": clients_interests_body,
+    "admin": admin_body,
+}
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in GENERATORS:
+            raise ValueError(
+                f"Unknown traffic kind {name!r}, expected one of {sorted(GENERATORS)}"
+            )
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = min(
+        len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values))) - 1)
+    )
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    total = len(latencies)
+    return {
+        "requests": total,
+        "errors": errors,
+        "rps": total / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "mean": sum(latencies) / total * 1000 if total else None,
+            "p50": percentile(latencies, 50) * 1000 if total else None,
+            "p95": percentile(latencies, 95) * 1000 if total else None,
+            "p99": percentile(latencies, 99) * 1000 if total else None,
+            "max": latencies[-1] * 1000 if total else None,
+        },
+    }
+
+
+class LoadRunner:
+    def __init__(self, host, port, weights, concurrency, duration, identities, seed=0):
+        self.host = host
+        self.port = port
+        self.kinds = list(weights)
+        self.weights = [weights[k] for k in self.kinds]
+        self.concurrency = concurrency
+        self.duration = duration
+        self.identities = identities
+        self.seed = seed
+        self._lock = threading.Lock()
+        self.latencies = {kind: [] for kind in self.kinds}
+        self.errors = {kind: 0 for kind in self.kinds}
+
+    def _client(self, worker_id, deadline):
+        rng = random.Random(self.seed + worker_id)
+        conn = HTTPConnection(self.host, self.port, timeout=10)
+        latencies = {kind: [] for kind in self.kinds}
+        errors = {kind: 0 for kind in self.kinds}
+        while time.monotonic() < deadline:
+            kind = rng.choices(self.kinds, self.weights)[0]
+            payload = json.dumps({"body": GENERATORS[kind](rng, self.identities)})
+            started = time.perf_counter()
+            try:
+                conn.request(
+                    "POST", "/method", payload, {"Content-Type": "application/json"}
+                )
+                response = conn.getresponse()
+                body = json.loads(response.read())
+                if body.get("code") != 200:
+                    errors[kind] += 1
+            except Exception:
+                errors[kind] += 1
+                conn.close()
+                continue
+            latencies[kind].append(time.perf_counter() - started)
+        conn.close()
+
+        with self._lock:
+            for kind in self.kinds:
+                self.latencies[kind].extend(latencies[kind])
+                self.errors[kind] += errors[kind]
+
+    def run(self):
+        deadline = time.monotonic() + self.duration
+        started = time.monotonic()
+        threads = [
+            threading.Thread(target=self._client, args=(i, deadline))
+            for i in range(self.concurrency)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.monotonic() - started
+
+        all_latencies = [
+            value for values in self.latencies.values() for value in values
+        ]
+        result = summarize(all_latencies, sum(self.errors.values()), elapsed)
+        result["by_method"] = {
+            kind: summarize(self.latencies[kind], self.errors[kind], elapsed)
+            for kind in self.kinds
+        }
+        return result
+
+
+class QuietHandler(MainHTTPHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def make_store(backend, latency, redis_nodes=("localhost:6379",)):
+    if backend == "memory":
+        return InMemoryStore(latency=latency) if latency else MemoryStore()
+    if backend == "fakeredis":
+        import fakeredis
+        pool = redis.ConnectionPool(
+            connection_class=fakeredis.FakeConnection, server=fakeredis.FakeServer()
+        )
+        return Store(pool=pool)
+    nodes = [Store(host, port, db) for host, port, db in map(parse_node, redis_nodes)]
+    return nodes[0] if len(nodes) == 1 else ShardedStore(nodes)
+
+
+def main():
+    parser = ArgumentParser(description='Load test for the /method endpoint')
+    parser.add_argument('--url',
+                        help='Target an already running server instead of starting one')
+    parser.add_argument('--backend', choices=['memory', 'fakeredis', 'redis'],
+                        default='memory', help='Store used by the in-process server')
+    parser.add_argument('--redis-nodes', default='localhost:6379',
+                        help='Comma-separated host:port[/db] list for --backend redis; '
+                             'several nodes are sharded')
+    parser.add_argument('--store-latency', type=float, default=0.0,
+                        help='Simulated round trip of the in-memory store, seconds')
+    parser.add_argument('--threads', type=int, default=16,
+                        help='Request thread pool of the in-process server')
+    parser.add_argument('-c', '--concurrency', type=int, default=8,
+                        help='Concurrent client connections')
+    parser.add_argument('-d', '--duration', type=float, default=10.0,
+                        help='Test duration, seconds')
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help='Traffic mix, e.g. "online_score=70,admin=30"')
+    parser.add_argument('--identities', type=int, default=1000,
+                        help='Distinct identities and client ids')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', default='bench_output.json',
+                        help='Where to write JSON results')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    weights = parse_mix(args.mix)
+
+    server = None
+    if args.url:
+        target = urlsplit(args.url)
+        host, port = target.hostname, target.port or 80
+    else:
+        server = make_server("127.0.0.1", 0, QuietHandler, threads=args.threads)
+        QuietHandler.store = make_store(args.backend, args.store_latency,
+                                        args.redis_nodes.split(','))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address
+
+    try:
+        runner = LoadRunner(host, port, weights, args.concurrency, args.duration,
+                            args.identities, seed=args.seed)
+        result = runner.run()
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "result": result,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    latency = result["latency_ms"]
+    print(f"{result['requests']} requests, {result['errors']} errors, "
+          f"{result['rps']:.1f} rps; p50={latency['p50']:.2f}ms "
+          f"p95={latency['p95']:.2f}ms p99={latency['p99']:.2f}ms -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+import time
+
+from src.storage import MemoryStore
+
+
+class InMemoryStore(MemoryStore):
+    def __init__(self, latency: float = 0.0, shards: int = 16):
+        super().__init__(shards=shards)
+        self.latency = latency
+
+    def _roundtrip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+
+class AsyncInMemoryStore:
+    def __init__(self, store=None):
+        self.store = store if store is not None else InMemoryStore()
+        self.name = self.store.name
+
+    def __getattr__(self, name):
+        method = getattr(self.store, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
@@ -1,6 +1,14 @@
-from http.server import HTTPServer
-from src.handlers import MainHTTPHandler
+from functools import partial
+
+from src import cache_keys, codec
+from src.cache_policy import score_policy, configure_policy
+from src.handlers import MainHTTPHandler, IDLE_TIMEOUT, MAX_REQUESTS_PER_CONNECTION, \
+    MAX_BODY_SIZE, MAX_IN_FLIGHT, REQUEST_TIMEOUT, STREAM_THRESHOLD, preload
+from src.local_cache import LocalCache
+from src.server import make_server, serve, serve_prefork
+from src.storage import MemoryStore, ShardedStore, parse_node, default_redis_nodes
 import logging
+import sys
 from argparse import ArgumentParser
 
 logging.basicConfig(
@@ -10,22 +18,127 @@ logging.basicConfig(
 )
 
 
-def main():
-    parser = ArgumentParser(description='Scoring API HTTP Server')
+def make_store(l1_size=0, l1_ttl=60, max_connections=50, backend="redis",
+               redis_nodes=("localhost:6379",)):
+    if backend == "memory":
+        return MemoryStore()
+
+    # redis is only imported when a Redis backend is actually configured
+    from src.store import Store
+
+    l1_cache = LocalCache(max_size=l1_size, ttl=l1_ttl) if l1_size > 0 else None
+    nodes = [Store(host, port, db, max_connections=max_connections, l1_cache=l1_cache)
+             for host, port, db in map(parse_node, redis_nodes)]
+    return nodes[0] if len(nodes) == 1 else ShardedStore(nodes)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['batch']:
+        from src.batch import main as batch_main
+        return batch_main(argv[1:])
+
+    parser = ArgumentParser(description='Scoring API HTTP Server '
+                                        '(use "batch --help" for offline scoring)')
     parser.add_argument('-p', '--port', type=int, default=8080, help='Port to listen on')
     parser.add_argument('-H', '--host', default='0.0.0.0', help='Host to bind to')
-    args = parser.parse_args()
-
-    server = HTTPServer((args.host, args.port), MainHTTPHandler)
-    logging.info(f'Starting server on {args.host}:{args.port}')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='Number of forked worker processes '
+                             'sharing the listening socket')
+    parser.add_argument('-t', '--threads', type=int, default=0,
+                        help='Size of the request thread pool per worker '
+                             '(0 - serve sequentially)')
+    parser.add_argument('--idle-timeout', type=float, default=IDLE_TIMEOUT,
+                        help='Seconds to keep an idle keep-alive connection open')
+    parser.add_argument('--max-requests-per-connection', type=int,
+                        default=MAX_REQUESTS_PER_CONNECTION,
+                        help='Close a keep-alive connection after this many requests')
+    parser.add_argument('--max-body-size', type=int, default=MAX_BODY_SIZE,
+                        help='Reject request bodies larger than this many bytes '
+                             'with 413')
+    parser.add_argument('--max-in-flight', type=int, default=MAX_IN_FLIGHT,
+                        help='Reject requests with 503 above this many queued '
+                             'or in progress per worker '
+                             '(requires --threads, 0 - unlimited)')
+    parser.add_argument('--request-timeout', type=float, default=REQUEST_TIMEOUT,
+                        help='Per-request deadline in seconds (0 - disabled)')
+    parser.add_argument('--key-namespace', default=cache_keys.namespace,
+                        help='Namespace prefix of hashed score cache keys')
+    parser.add_argument('--no-legacy-key-reads', action='store_true',
+                        help='Do not fall back to pre-v2 plain-text score cache keys '
+                             'on a miss')
+    parser.add_argument('--score-ttl', type=float, default=score_policy.ttl,
+                        help='Seconds a cached score is served as fresh')
+    parser.add_argument('--ttl-jitter', type=float, default=score_policy.jitter,
+                        help='Random +/- fraction applied to --score-ttl '
+                             'of every cached score')
+    parser.add_argument('--stale-window', type=float, default=score_policy.stale,
+                        help='Seconds an expired score is still served '
+                             'while it is refreshed in the background')
+    parser.add_argument('--cache-policy', action='append', default=[],
+                        metavar='NAME:OPTION=VALUE,...',
+                        help='Override a cache policy (online_score, invalid) '
+                             'with ttl, jitter, stale, enabled, l1, max_value_size, '
+                             'namespace, e.g. "invalid:ttl=30" '
+                             'or "online_score:l1=off"; repeatable')
+    parser.add_argument('--json-codec', choices=['auto'] + list(codec.FACTORIES),
+                        default='auto',
+                        help='JSON backend for request parsing and response encoding')
+    parser.add_argument('--store', choices=['redis', 'memory'], default='redis',
+                        help='Storage backend '
+                             '(memory - sharded in-process dict, per worker)')
+    parser.add_argument('--redis-nodes', default=default_redis_nodes(),
+                        help='Comma-separated host:port[/db] list; '
+                             'several nodes are consistent-hashed '
+                             '(default: $SCORING_REDIS_NODES '
+                             'or $REDIS_HOST:$REDIS_PORT/$REDIS_DB)')
+    parser.add_argument('--max-connections', type=int, default=50,
+                        help='Max Redis connections in the pool of each worker')
+    parser.add_argument('--l1-size', type=int, default=0,
+                        help='Max entries of the in-process score cache (0 - disabled)')
+    parser.add_argument('--l1-ttl', type=float, default=60,
+                        help='TTL in seconds of the in-process score cache entries')
+    parser.add_argument('--stream-threshold', type=int, default=STREAM_THRESHOLD,
+                        help='Stream clients_interests responses with more client_ids '
+                             'than this (0 - never)')
+    parser.add_argument('--preload', nargs='?', const='', metavar='FILE',
+                        help='Before accepting traffic, connect to the store and warm '
+                             'the auth digest and request path in every worker; FILE '
+                             'is a JSONL of online_score arguments to warm the score '
+                             'cache')
+    args = parser.parse_args(argv)
+    if args.max_in_flight > 0 and args.threads <= 0:
+        parser.error('--max-in-flight requires --threads')
 
+    logging.info(f'Using {codec.use(args.json_codec)} JSON codec')
+    cache_keys.configure(args.key_namespace, not args.no_legacy_key_reads)
+    score_policy.configure(args.score_ttl, args.ttl_jitter, args.stale_window)
     try:
-        server.serve_forever()
-    except KeyboardInterrupt:
-        logging.info('Server stopped')
-    finally:
-        server.server_close()
+        for spec in args.cache_policy:
+            configure_policy(spec)
+    except ValueError as e:
+        parser.error(str(e))
+    MainHTTPHandler.timeout = args.idle_timeout
+    MainHTTPHandler.max_requests_per_connection = args.max_requests_per_connection
+    MainHTTPHandler.max_body_size = args.max_body_size
+    MainHTTPHandler.request_timeout = args.request_timeout
+    MainHTTPHandler.stream_threshold = args.stream_threshold
+    server = make_server(args.host, args.port, MainHTTPHandler, threads=args.threads,
+                         max_in_flight=args.max_in_flight)
+    logging.info(f'Starting server on {args.host}:{args.port} '
+                 f'(workers={args.workers}, threads={args.threads})')
+
+    store_factory = partial(make_store, args.l1_size, args.l1_ttl,
+                            args.max_connections, args.store,
+                            args.redis_nodes.split(','))
+    warmup = None
+    if args.preload is not None:
+        warmup = partial(preload, identities=args.preload or None)
+    if args.workers > 1:
+        serve_prefork(server, args.workers, store_factory, warmup)
+    else:
+        serve(server, store_factory, warmup)
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
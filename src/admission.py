@@ -0,0 +1,64 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+_deadline: contextvars.ContextVar = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class InFlightLimiter:
+    def __init__(self, limit: int = 0):
+        self.limit = limit
+        self.in_flight = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.limit > 0 and self.in_flight >= self.limit:
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+
+def start_deadline(ctx: dict, timeout: float) -> None:
+    if timeout > 0:
+        ctx["deadline"] = time.monotonic() + timeout
+
+
+@contextmanager
+def deadline_scope(ctx: dict):
+    token = _deadline.set(ctx.get("deadline"))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def expired(ctx: Optional[dict] = None) -> bool:
+    deadline = _deadline.get() if ctx is None else ctx.get("deadline")
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def check_deadline() -> Optional[float]:
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return left
@@ -1,7 +1,10 @@
 import datetime
 import hashlib
+import hmac
+import time
 from .model import ClientIDsField, CharField, DateField, EmailField, GenderField, PhoneField, BirthDayField, \
-    ArgumentFileField, Field
+    ArgumentFileField, ArgumentsListField, Schema
+from .local_cache import LocalCache
 
 SALT = "Otus"
 ADMIN_LOGIN = "admin"
@@ -11,57 +14,40 @@ UNKNOWN = 0
 MALE = 1
 FEMALE = 2
 
-class Request:
+METHODS = ("clients_interests", "online_score", "online_score_batch")
+MAX_BATCH_SIZE = 1000
+TOKEN_LENGTH = 128  # hex SHA-512
+MAX_CACHED_IDENTITY = 256
+
+
+class Request(Schema):
     account = CharField(required=False, nullable=True)
     login = CharField(required=True, nullable=True)
     token = CharField(required=True, nullable=True)
-    arguments = ArgumentFileField(required=True, nullable=True)
+    arguments = ArgumentFileField(required=False, nullable=True)
     method = CharField(required=True, nullable=False)
 
     def __init__(self, data):
-        self.login = data['body']['login']
-        self.token = data['body']['token']
-        self.method = data['body']['method']
-        self.account = data['body'].get('account')
-        self.arguments = data['body'].get('arguments', {})
+        super().__init__(data['body'])
 
+    def validate(self):
         if not all([self.login, self.token, self.method]):
             raise ValueError("Missing required fields")
 
-        if self.method not in ["clients_interests", "online_score"]:
-                raise ValueError(f'Invalid method "{self.method}"')
+        if self.method not in METHODS:
+            raise ValueError(f'Invalid method "{self.method}"')
 
     @property
     def is_admin(self):
         return self.login == ADMIN_LOGIN
 
 
-class ClientsInterestsRequest(object):
+class ClientsInterestsRequest(Schema):
     client_ids = ClientIDsField(required=True)
     date = DateField(required=False, nullable=True)
 
-    def __init__(self, arguments):
-        self.client_ids = arguments.get('client_ids')
-        self.date = arguments.get('date')
-
-        if not isinstance(self.client_ids, list) or not self.client_ids:
-            raise ValueError("client_ids must be a non-empty list")
-
-        if not all(isinstance(x, int) for x in self.client_ids):
-            raise ValueError("All client_ids must be integers")
-
-        if self.date and not self._validate_date(self.date):
-            raise ValueError("Invalid date format. Use DD.MM.YYYY")
 
-
-    def _validate_date(self, date_str):
-        try:
-            datetime.datetime.strptime(date_str, "%d.%m.%Y")
-            return True
-        except ValueError:
-            return False
-
-class OnlineScoreRequest(object):
+class OnlineScoreRequest(Schema):
     first_name = CharField(required=False, nullable=True)
     last_name = CharField(required=False, nullable=True)
     email = EmailField(required=False, nullable=True)
@@ -69,47 +55,85 @@ class OnlineScoreRequest(object):
     birthday = BirthDayField(required=False, nullable=True)
     gender = GenderField(required=False, nullable=True)
 
-    def __init__(self, arguments):
-            for field_name, field in self.__class__.__dict__.items():
-                if isinstance(field, Field):
-                    field.field_name = field_name
-
-            for field_name, field in self.__class__.__dict__.items():
-                if isinstance(field, Field):
-                    value = arguments.get(field_name)
-                    setattr(self, field_name, field.validate(value))
+    def validate(self):
+        if not (self.phone and self.email
+                or self.first_name and self.last_name
+                or self.gender is not None and self.birthday):
+            raise ValueError(
+                "Requires at least one pair: "
+                "phone-email, first_name-last_name, or gender-birthday"
+            )
+
+
+class OnlineScoreBatchRequest(Schema):
+    __slots__ = ("requests",)
+
+    items = ArgumentsListField(required=True)
+
+    def validate(self):
+        if len(self.items) > MAX_BATCH_SIZE:
+            raise ValueError(f"items must contain at most {MAX_BATCH_SIZE} entries")
+
+        self.requests = []
+        for arguments in self.items:
+            try:
+                self.requests.append(OnlineScoreRequest(arguments))
+            except ValueError as e:
+                self.requests.append(e)
+
+
+class Authenticator:
+    def __init__(self, cache_size=10000):
+        self._admin_digest = None
+        self._admin_valid_until = 0.0
+        # digests of verified users only,
+        # so failed attempts cannot fill the cache or evict real users
+        self.verified = LocalCache(max_size=cache_size, ttl=float("inf"))
+
+    def check_user(self, account, login, token):
+        identity = account + login
+        digest = self.verified.get(identity)
+        if digest is not None:
+            return hmac.compare_digest(digest, token.encode('utf-8'))
+
+        digest = hashlib.sha512((identity + SALT).encode('utf-8')).hexdigest()
+        digest = digest.encode('utf-8')
+        if not hmac.compare_digest(digest, token.encode('utf-8')):
+            return False
+        if len(identity) <= MAX_CACHED_IDENTITY:
+            self.verified.set(identity, digest)
+        return True
+
+    def admin_digest(self):
+        if time.time() >= self._admin_valid_until:
+            now = datetime.datetime.now()
+            hour = now.replace(minute=0, second=0, microsecond=0)
+            digest = hashlib.sha512(
+                (hour.strftime("%Y%m%d%H") + ADMIN_SALT).encode('utf-8')
+            ).hexdigest()
+            self._admin_digest = digest
+            self._admin_valid_until = (hour + datetime.timedelta(hours=1)).timestamp()
+        return self._admin_digest
+
+    def check(self, account, login, token):
+        if not isinstance(token, str) or len(token) != TOKEN_LENGTH:
+            return False
+        if login == ADMIN_LOGIN:
+            return hmac.compare_digest(
+                self.admin_digest().encode('utf-8'), token.encode('utf-8')
+            )
+        return self.check_user(account or '', login or '', token)
 
-            has_pairs = [
-                bool(self.phone and self.email),
-                bool(self.first_name and self.last_name),
-                bool(self.gender is not None and self.birthday)
-            ]
 
-            if not any(has_pairs):
-                raise ValueError("Requires at least one pair: phone-email, first_name-last_name, or gender-birthday")
+authenticator = Authenticator()
 
 
 def check_auth(request_data):
     if isinstance(request_data, dict):
-
         body = request_data.get('body', {})
-        login = body.get('login')
-        is_admin = login == ADMIN_LOGIN
-
-        if is_admin:
-            digest = hashlib.sha512(
-                (datetime.datetime.now().strftime("%Y%m%d%H") + ADMIN_SALT).encode('utf-8')).hexdigest()
-        else:
-            account = body.get('account', '')
-            login = body.get('login', '')
-            digest = hashlib.sha512((account + login + SALT).encode('utf-8')).hexdigest()
-
-        return digest == body.get('token')
-    else:
-
-        if request_data.is_admin:
-            digest = hashlib.sha512(
-                (datetime.datetime.now().strftime("%Y%m%d%H") + ADMIN_SALT).encode('utf-8')).hexdigest()
-        else:
-            digest = hashlib.sha512((request_data.account + request_data.login + SALT).encode('utf-8')).hexdigest()
-        return digest == request_data.token
\ No newline at end of file
+        return authenticator.check(
+            body.get('account'), body.get('login'), body.get('token')
+        )
+    return authenticator.check(
+        request_data.account, request_data.login, request_data.token
+    )
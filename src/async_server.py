@@ -0,0 +1,385 @@
+import asyncio
+import logging
+import uuid
+from argparse import ArgumentParser
+from http import HTTPStatus
+
+from src import cache_keys, codec
+from src.cache_policy import score_policy, invalid_requests, configure_policy
+from src.admission import DeadlineExceeded, InFlightLimiter, start_deadline, \
+    deadline_scope, expired
+from src.async_store import AsyncStore
+from src.handlers import IDLE_TIMEOUT, MAX_REQUESTS_PER_CONNECTION, MAX_BODY_SIZE, \
+    MAX_IN_FLIGHT, REQUEST_TIMEOUT, OK, BAD_REQUEST, NOT_FOUND, PAYLOAD_TOO_LARGE, \
+    INVALID_REQUEST, INTERNAL_ERROR, SERVICE_UNAVAILABLE, validate_method_request, \
+    score_arguments, clients_interests_response, online_score_response, make_envelope, \
+    valid_batch_items, online_score_batch_response, method_label, deadline_exceeded, \
+    STREAM_THRESHOLD, InterestsStream, streams_interests, chunk_frame
+from src.local_cache import LocalCache
+from src.storage import AsyncShardedStore, parse_node, default_redis_nodes
+from src.metrics import REGISTRY, REQUESTS_TOTAL, REQUESTS_SHED_TOTAL, \
+    INVALID_CACHE_HITS_TOTAL, stage, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from src.scoring_service import get_score_async, get_interests_batch_async, \
+    get_scores_batch_async
+
+MAX_HEADERS = 100
+
+
+async def async_method_handler(request_dict, ctx, store):
+    try:
+        call, error = validate_method_request(request_dict, ctx)
+        if error:
+            return error
+        if expired(ctx):
+            return deadline_exceeded(ctx)
+
+        with stage("compute", call.method, ctx):
+            if call.method == 'clients_interests':
+                if streams_interests(ctx, call.request.client_ids):
+                    return InterestsStream(store, call.request.client_ids, ctx), OK
+                interests = await get_interests_batch_async(
+                    store, call.request.client_ids
+                )
+                return clients_interests_response(interests, ctx)
+
+            if call.method == 'online_score_batch':
+                items = valid_batch_items(call.request)
+                if call.is_admin:
+                    scores = [42] * len(items)
+                else:
+                    scores = await get_scores_batch_async(
+                        store, [score_arguments(item) for item in items]
+                    )
+                return online_score_batch_response(call.request, scores, ctx)
+
+            if call.is_admin:
+                score = 42
+            else:
+                score = await get_score_async(store, **score_arguments(call.request))
+            return online_score_response(score, call.arguments, ctx)
+
+    except DeadlineExceeded:
+        return deadline_exceeded(ctx)
+    except Exception:
+        logging.exception("Handler error")
+        return {"error": "Internal error"}, INTERNAL_ERROR
+
+
+class AsyncHTTPServer:
+    router = {"method": async_method_handler}
+
+    def __init__(self, store, idle_timeout=IDLE_TIMEOUT,
+                 max_requests_per_connection=MAX_REQUESTS_PER_CONNECTION,
+                 max_body_size=MAX_BODY_SIZE, max_in_flight=MAX_IN_FLIGHT,
+                 request_timeout=REQUEST_TIMEOUT, stream_threshold=STREAM_THRESHOLD):
+        self.store = store
+        self.stream_threshold = stream_threshold
+        self.idle_timeout = idle_timeout
+        self.max_requests_per_connection = max_requests_per_connection
+        self.max_body_size = max_body_size
+        self.request_timeout = request_timeout
+        self.limiter = InFlightLimiter(max_in_flight)
+
+    async def process(self, path, headers, raw_body, streaming=False):
+        response, code = {}, OK
+        context = {"request_id": headers.get('x-request-id', uuid.uuid4().hex)}
+        start_deadline(context, self.request_timeout)
+        if streaming:
+            context["stream_threshold"] = self.stream_threshold
+        request = None
+        method = ""
+
+        invalid_key = invalid_requests.key(path, raw_body)
+        rejected = invalid_requests.get(invalid_key)
+        if rejected:
+            method, payload = rejected
+            INVALID_CACHE_HITS_TOTAL.inc(method)
+            REQUESTS_TOTAL.inc(method, str(INVALID_REQUEST))
+            return INVALID_REQUEST, payload
+
+        try:
+            with stage("decode", ctx=context):
+                request = codec.loads(raw_body)
+        except Exception:
+            code = BAD_REQUEST
+
+        if request:
+            try:
+                request_body = request.get('body', {})
+                request_headers = request.get('headers', {})
+                method = method_label(request_body.get('method'))
+                path = path.strip("/")
+                if path in self.router:
+                    with stage("handle", method, context), deadline_scope(context):
+                        response, code = await self.router[path](
+                            {"body": request_body, "headers": request_headers},
+                            context,
+                            self.store,
+                        )
+                else:
+                    code = NOT_FOUND
+            except Exception as e:
+                logging.error(f"Request failed: {str(e)}")
+                code = INTERNAL_ERROR if code == OK else code
+
+        if isinstance(response, InterestsStream):
+            return code, response
+
+        with stage("encode", method, context):
+            payload = codec.dumps(make_envelope(response, code))
+        if code == INVALID_REQUEST:
+            invalid_requests.add(invalid_key, method, payload)
+
+        REQUESTS_TOTAL.inc(method, str(code))
+        logging.info(f'"POST {path}" {code} {context["request_id"]}')
+        logging.debug(
+            f"Request {context['request_id']} {method} {code} "
+            f"timings={context.get('timings')}"
+        )
+        return code, payload
+
+    async def read_request(self, reader):
+        request_line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+        if not request_line:
+            return None
+        # headers and body share one timeout,
+        # so a client trickling them cannot hold the connection open
+        return await asyncio.wait_for(
+            self.read_message(reader, request_line), self.idle_timeout
+        )
+
+    async def read_message(self, reader, request_line):
+        method, path, version = request_line.decode('latin-1').split()
+
+        headers = {}
+        for _ in range(MAX_HEADERS):
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        content_length = int(headers.get('content-length', 0))
+        if content_length < 0:
+            raise ValueError(f"Invalid Content-Length {content_length}")
+        if content_length > self.max_body_size:
+            return method, path, version, headers, None
+        body = await reader.readexactly(content_length) if content_length else b''
+        return method, path, version, headers, body
+
+    def write_response(
+        self, writer, code, body, keep_alive, content_type="application/json"
+    ):
+        status = HTTPStatus(code)
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            f"\r\n".encode('latin-1') + body
+        )
+
+    async def write_stream(self, writer, stream, keep_alive):
+        chunks = stream.chunks_async(get_interests_batch_async)
+        method = "clients_interests"
+        with stage("write", method, stream.ctx), deadline_scope(stream.ctx):
+            try:
+                first = await anext(chunks)
+            except DeadlineExceeded:
+                response, code = deadline_exceeded(stream.ctx)
+                REQUESTS_TOTAL.inc(method, str(code))
+                self.write_response(
+                    writer, code, codec.dumps(make_envelope(response, code)), keep_alive
+                )
+                return keep_alive
+            except Exception:
+                logging.exception("Interests stream failed")
+                REQUESTS_TOTAL.inc(method, str(INTERNAL_ERROR))
+                payload = codec.dumps(make_envelope({}, INTERNAL_ERROR))
+                self.write_response(writer, INTERNAL_ERROR, payload, keep_alive)
+                return keep_alive
+
+            writer.write(
+                f"HTTP/1.1 {OK} OK\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Transfer-Encoding: chunked\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                f"\r\n".encode('latin-1') + chunk_frame(first)
+            )
+            try:
+                async for chunk in chunks:
+                    await writer.drain()
+                    writer.write(chunk_frame(chunk))
+            except Exception:
+                # the status line is already sent:
+                # drop the connection so the client sees a truncated body
+                logging.exception("Interests stream aborted")
+                REQUESTS_TOTAL.inc(method, str(INTERNAL_ERROR))
+                return False
+            writer.write(b"0\r\n\r\n")
+        REQUESTS_TOTAL.inc(method, str(OK))
+        return keep_alive
+
+    async def handle_connection(self, reader, writer):
+        requests_served = 0
+        try:
+            while True:
+                parsed = await self.read_request(reader)
+                if parsed is None:
+                    break
+                method, path, version, headers, body = parsed
+
+                connection = headers.get('connection', '').lower()
+                keep_alive = (
+                    connection == 'keep-alive'
+                    if version == 'HTTP/1.0'
+                    else connection != 'close'
+                )
+                requests_served += 1
+                if requests_served >= self.max_requests_per_connection:
+                    keep_alive = False
+
+                content_type = "application/json"
+                if body is None:
+                    REQUESTS_SHED_TOTAL.inc("body_too_large")
+                    code = PAYLOAD_TOO_LARGE
+                    payload = codec.dumps(make_envelope({}, code))
+                    keep_alive = False
+                elif method == 'POST':
+                    if self.limiter.try_acquire():
+                        try:
+                            code, payload = await self.process(
+                                path, headers, body, version == 'HTTP/1.1')
+                            if isinstance(payload, InterestsStream):
+                                keep_alive = await self.write_stream(
+                                    writer, payload, keep_alive)
+                                payload = None
+                        finally:
+                            self.limiter.release()
+                    else:
+                        REQUESTS_SHED_TOTAL.inc("overload")
+                        code = SERVICE_UNAVAILABLE
+                        payload = codec.dumps(make_envelope({}, code))
+                        keep_alive = False
+                elif method == 'GET' and path.split("?")[0].strip("/") == "metrics":
+                    code, payload = OK, REGISTRY.render()
+                    content_type = METRICS_CONTENT_TYPE
+                else:
+                    code, payload = NOT_FOUND, codec.dumps(make_envelope({}, NOT_FOUND))
+
+                if payload is not None:
+                    self.write_response(writer, code, payload, keep_alive, content_type)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (
+            asyncio.TimeoutError,
+            asyncio.IncompleteReadError,
+            ConnectionError,
+            ValueError,
+        ):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_forever(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        logging.info(f'Starting asyncio server on {host}:{port}')
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = ArgumentParser(description='Scoring API asyncio HTTP Server')
+    parser.add_argument('-p', '--port', type=int, default=8080,
+                        help='Port to listen on')
+    parser.add_argument('-H', '--host', default='0.0.0.0', help='Host to bind to')
+    parser.add_argument('--idle-timeout', type=float, default=IDLE_TIMEOUT,
+                        help='Seconds to keep an idle keep-alive connection open')
+    parser.add_argument('--max-requests-per-connection', type=int,
+                        default=MAX_REQUESTS_PER_CONNECTION,
+                        help='Close a keep-alive connection after this many requests')
+    parser.add_argument('--max-body-size', type=int, default=MAX_BODY_SIZE,
+                        help='Reject request bodies larger than this many bytes '
+                             'with 413')
+    parser.add_argument('--max-in-flight', type=int, default=MAX_IN_FLIGHT,
+                        help='Reject requests with 503 above this many in flight '
+                             '(0 - unlimited)')
+    parser.add_argument('--request-timeout', type=float, default=REQUEST_TIMEOUT,
+                        help='Per-request deadline in seconds (0 - disabled)')
+    parser.add_argument('--key-namespace', default=cache_keys.namespace,
+                        help='Namespace prefix of hashed score cache keys')
+    parser.add_argument('--no-legacy-key-reads', action='store_true',
+                        help='Do not fall back to pre-v2 plain-text score cache keys '
+                             'on a miss')
+    parser.add_argument('--score-ttl', type=float, default=score_policy.ttl,
+                        help='Seconds a cached score is served as fresh')
+    parser.add_argument('--ttl-jitter', type=float, default=score_policy.jitter,
+                        help='Random +/- fraction applied to --score-ttl '
+                             'of every cached score')
+    parser.add_argument('--stale-window', type=float, default=score_policy.stale,
+                        help='Seconds an expired score is still served '
+                             'while it is refreshed in the background')
+    parser.add_argument('--cache-policy', action='append', default=[],
+                        metavar='NAME:OPTION=VALUE,...',
+                        help='Override a cache policy (online_score, invalid) '
+                             'with ttl, jitter, stale, enabled, l1, max_value_size, '
+                             'namespace, e.g. "invalid:ttl=30" '
+                             'or "online_score:l1=off"; repeatable')
+    parser.add_argument('--json-codec', choices=['auto'] + list(codec.FACTORIES),
+                        default='auto',
+                        help='JSON backend for request parsing and response encoding')
+    parser.add_argument('--redis-nodes', default=default_redis_nodes(),
+                        help='Comma-separated host:port[/db] list; '
+                             'several nodes are consistent-hashed '
+                             '(default: $SCORING_REDIS_NODES '
+                             'or $REDIS_HOST:$REDIS_PORT/$REDIS_DB)')
+    parser.add_argument('--max-connections', type=int, default=100,
+                        help='Max Redis connections in the pool')
+    parser.add_argument('--l1-size', type=int, default=0,
+                        help='Max entries of the in-process score cache (0 - disabled)')
+    parser.add_argument('--l1-ttl', type=float, default=60,
+                        help='TTL in seconds of the in-process score cache entries')
+    parser.add_argument('--stream-threshold', type=int, default=STREAM_THRESHOLD,
+                        help='Stream clients_interests responses with more client_ids '
+                             'than this (0 - never)')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='[%(asctime)s] %(levelname).1s %(message)s',
+        datefmt='%Y.%m.%d %H:%M:%S'
+    )
+
+    logging.info(f'Using {codec.use(args.json_codec)} JSON codec')
+    cache_keys.configure(args.key_namespace, not args.no_legacy_key_reads)
+    score_policy.configure(args.score_ttl, args.ttl_jitter, args.stale_window)
+    try:
+        for spec in args.cache_policy:
+            configure_policy(spec)
+    except ValueError as e:
+        parser.error(str(e))
+    l1_cache = (
+        LocalCache(max_size=args.l1_size, ttl=args.l1_ttl) if args.l1_size > 0 else None
+    )
+    nodes = [AsyncStore(host, port, db, max_connections=args.max_connections,
+                        l1_cache=l1_cache)
+             for host, port, db in map(parse_node, args.redis_nodes.split(','))]
+    store = nodes[0] if len(nodes) == 1 else AsyncShardedStore(nodes)
+    server = AsyncHTTPServer(
+        store,
+        idle_timeout=args.idle_timeout,
+        max_requests_per_connection=args.max_requests_per_connection,
+        max_body_size=args.max_body_size,
+        max_in_flight=args.max_in_flight,
+        request_timeout=args.request_timeout,
+        stream_threshold=args.stream_threshold,
+    )
+    try:
+        asyncio.run(server.serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        logging.info('Server stopped')
+
+
+if __name__ == '__main__':
+    main()
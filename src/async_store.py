@@ -0,0 +1,225 @@
+import asyncio
+import logging
+from typing import Optional, Any, Dict, List
+import redis
+import redis.asyncio
+
+from src.admission import DeadlineExceeded, check_deadline, remaining
+from src.circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED
+from src.metrics import timed_store_operation
+from src.storage import Expire, cache_expire, key_expire
+from src.store import STORE_ERRORS, encode_value, pool_stats, report_circuit_state
+
+
+class AsyncStore:
+    def __init__(self, host='localhost', port=6379, db=0,
+                 reconnect_attempts=3, reconnect_delay=0.1,
+                 connect_timeout=1, read_timeout=1, max_connections=100,
+                 l1_cache=None, breaker_threshold=5, breaker_timeout=5.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.name = f"{host}:{port}/{db}"
+        self.reconnect_attempts = reconnect_attempts
+        self.reconnect_delay = reconnect_delay
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.l1_cache = l1_cache
+        self._pool = redis.asyncio.ConnectionPool(
+            host=self.host,
+            port=self.port,
+            db=self.db,
+            socket_timeout=self.read_timeout,
+            socket_connect_timeout=self.connect_timeout,
+            max_connections=max_connections
+        )
+        self._client = redis.asyncio.Redis(connection_pool=self._pool)
+        self.breaker = CircuitBreaker(
+            failure_threshold=breaker_threshold,
+            recovery_timeout=breaker_timeout,
+            name=self.name,
+            on_state_change=report_circuit_state
+        )
+
+    async def _execute_with_retry(self, func, *args, **kwargs):
+        check_deadline()
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit breaker for {self.breaker.name} is open")
+
+        for attempt in range(self.reconnect_attempts):
+            left = check_deadline()
+            try:
+                if left is None:
+                    result = await func(*args, **kwargs)
+                else:
+                    result = await asyncio.wait_for(func(*args, **kwargs), left)
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("Request deadline exceeded") from None
+            except STORE_ERRORS:
+                self.breaker.record_failure()
+                left = remaining()
+                if (
+                    attempt == self.reconnect_attempts - 1
+                    or self.breaker.state != CLOSED
+                    or (left is not None and left <= self.reconnect_delay)
+                ):
+                    raise
+                logging.warning(
+                    f"Operation failed, retrying... (attempt {attempt + 1})"
+                )
+                await asyncio.sleep(self.reconnect_delay)
+                await self._pool.disconnect(inuse_connections=False)
+            else:
+                self.breaker.record_success()
+                return result
+        return None
+
+    async def close(self):
+        await self._client.aclose()
+        await self._pool.disconnect()
+
+    async def ping(self) -> bool:
+        try:
+            return bool(await self._execute_with_retry(self._client.ping))
+        except (*STORE_ERRORS, DeadlineExceeded):
+            return False
+
+    def pool_stats(self) -> Dict[str, int]:
+        return pool_stats(self._pool)
+
+    def breaker_stats(self) -> Dict[str, object]:
+        return self.breaker.stats()
+
+    @timed_store_operation("get")
+    async def get(self, key: str) -> Optional[Any]:
+        try:
+            return await self._execute_with_retry(self._client.get, key)
+        except STORE_ERRORS:
+            return None
+
+    @timed_store_operation("cache_get")
+    async def cache_get(self, key: str, l1: bool = True) -> Optional[Any]:
+        l1_cache = self.l1_cache if l1 else None
+        if l1_cache is not None:
+            value = l1_cache.get(key)
+            if value is not None:
+                return value
+
+        try:
+            value = await self._execute_with_retry(self._client.get, f"cache:{key}")
+        except STORE_ERRORS:
+            return None
+
+        if value is not None and l1_cache is not None:
+            l1_cache.set(key, value)
+        return value
+
+    @timed_store_operation("cache_set")
+    async def cache_set(self, key: str, value: Any, expire: int = 60,
+                        l1: bool = True) -> bool:
+        l1_cache = self.l1_cache if l1 else None
+        if l1_cache is not None:
+            l1_cache.set(key, encode_value(value), expire)
+
+        try:
+            return bool(await self._execute_with_retry(
+                self._client.setex, f"cache:{key}", expire, value
+            ))
+        except STORE_ERRORS:
+            return False
+
+    @timed_store_operation("set")
+    async def set(self, key: str, value: Any) -> bool:
+        try:
+            return bool(await self._execute_with_retry(self._client.set, key, value))
+        except STORE_ERRORS:
+            return False
+
+    @timed_store_operation("get_many")
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        if not keys:
+            return []
+        try:
+            values = await self._execute_with_retry(self._client.mget, keys)
+        except STORE_ERRORS:
+            values = None
+        return values if values is not None else [None] * len(keys)
+
+    @timed_store_operation("set_many")
+    async def set_many(self, mapping: Dict[str, Any],
+                       expire: Optional[Expire] = None) -> bool:
+        if not mapping:
+            return True
+
+        async def _write():
+            pipe = self._client.pipeline(transaction=False)
+            for key, value in mapping.items():
+                pipe.set(key, value, ex=key_expire(expire, key))
+            return all(await pipe.execute())
+
+        try:
+            return bool(await self._execute_with_retry(_write))
+        except STORE_ERRORS:
+            return False
+
+    @timed_store_operation("hget_many")
+    async def hget_many(
+        self, fields: Dict[str, List[str]]
+    ) -> Dict[str, List[Optional[Any]]]:
+        if not fields:
+            return {}
+
+        async def _read():
+            pipe = self._client.pipeline(transaction=False)
+            for key, names in fields.items():
+                pipe.hmget(key, names)
+            return dict(zip(fields, await pipe.execute()))
+
+        try:
+            return await self._execute_with_retry(_read)
+        except STORE_ERRORS:
+            return {key: [None] * len(names) for key, names in fields.items()}
+
+    @timed_store_operation("hset_many")
+    async def hset_many(self, mapping: Dict[str, Dict[str, Any]]) -> bool:
+        if not mapping:
+            return True
+
+        async def _write():
+            pipe = self._client.pipeline(transaction=False)
+            for key, values in mapping.items():
+                pipe.hset(key, mapping=values)
+            await pipe.execute()
+            return True
+
+        try:
+            return bool(await self._execute_with_retry(_write))
+        except STORE_ERRORS:
+            return False
+
+    @timed_store_operation("cache_get_many")
+    async def cache_get_many(self, keys: List[str],
+                             l1: bool = True) -> List[Optional[Any]]:
+        l1_cache = self.l1_cache if l1 else None
+        values: List[Optional[Any]] = [None] * len(keys)
+        if l1_cache is not None:
+            values = [l1_cache.get(key) for key in keys]
+
+        missing = [i for i, value in enumerate(values) if value is None]
+        if missing:
+            fetched = await self.get_many([f"cache:{keys[i]}" for i in missing])
+            for i, value in zip(missing, fetched):
+                values[i] = value
+                if value is not None and l1_cache is not None:
+                    l1_cache.set(keys[i], value)
+        return values
+
+    @timed_store_operation("cache_set_many")
+    async def cache_set_many(self, mapping: Dict[str, Any], expire: Expire = 60,
+                             l1: bool = True) -> bool:
+        l1_cache = self.l1_cache if l1 else None
+        if l1_cache is not None:
+            for key, value in mapping.items():
+                l1_cache.set(key, encode_value(value), key_expire(expire, key))
+        prefixed = {f"cache:{key}": value for key, value in mapping.items()}
+        return await self.set_many(prefixed, cache_expire(expire))
@@ -0,0 +1,285 @@
+import logging
+import sys
+import time
+from argparse import ArgumentParser
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+from typing import Callable, Deque, Iterable, Iterator, Tuple
+
+from src import cache_keys, codec
+from src.cache_policy import score_policy
+from src.api_requests import OnlineScoreRequest
+from src.handlers import OK, BAD_REQUEST, INTERNAL_ERROR, validate_method_request, \
+    score_arguments, clients_interests_response, online_score_response, \
+    valid_batch_items, online_score_batch_response, make_envelope
+from src.scoring_service import get_scores_batch, get_interests_batch
+from src.storage import ShardedStore, parse_node, default_redis_nodes
+from src.store import Store
+
+CHUNK_SIZE = 500
+WORKERS = 4
+
+_store = None
+
+
+def read_lines(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield line
+
+
+def chunked(lines, size):
+    lines = iter(lines)
+    while True:
+        chunk = list(islice(lines, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_request(line):
+    request = codec.loads(line)
+    if not isinstance(request, dict):
+        raise ValueError("Request must be a JSON object")
+    if "body" in request:
+        return {"body": request["body"], "headers": request.get("headers", {})}
+    return {"body": request, "headers": {}}
+
+
+def _fetch(results, calls, methods, fetch):
+    try:
+        return fetch()
+    except Exception:
+        logging.exception("Batch fetch failed")
+        for i, call, _ in calls:
+            if call.method in methods:
+                results[i] = ({"error": "Internal error"}, INTERNAL_ERROR)
+        return None
+
+
+def process_chunk(lines, store):
+    results = [None] * len(lines)
+    calls = []
+    for i, line in enumerate(lines):
+        try:
+            request_dict = parse_request(line)
+        except Exception:
+            results[i] = ({}, BAD_REQUEST)
+            continue
+        ctx = {}
+        try:
+            call, error = validate_method_request(request_dict, ctx)
+        except Exception:
+            logging.exception("Batch request validation failed")
+            results[i] = ({"error": "Internal error"}, INTERNAL_ERROR)
+            continue
+        if error:
+            results[i] = error
+        else:
+            calls.append((i, call, ctx))
+
+    score_items = []
+    for _, call, _ in calls:
+        if call.is_admin:
+            continue
+        if call.method == 'online_score':
+            score_items.append(score_arguments(call.request))
+        elif call.method == 'online_score_batch':
+            items = valid_batch_items(call.request)
+            score_items.extend(score_arguments(item) for item in items)
+    cids = [cid for _, call, _ in calls if call.method == 'clients_interests'
+            for cid in call.request.client_ids]
+
+    scores = _fetch(results, calls, ('online_score', 'online_score_batch'),
+                    lambda: iter(get_scores_batch(store, score_items)))
+    interests = _fetch(results, calls, ('clients_interests',),
+                       lambda: get_interests_batch(store, cids) if cids else {})
+
+    for i, call, ctx in calls:
+        if results[i] is not None:
+            continue
+        if call.method == 'clients_interests':
+            found = {cid: interests[cid] for cid in call.request.client_ids}
+            results[i] = clients_interests_response(found, ctx)
+        elif call.method == 'online_score_batch':
+            items = valid_batch_items(call.request)
+            if call.is_admin:
+                values = [42] * len(items)
+            else:
+                values = [next(scores) for _ in items]
+            results[i] = online_score_batch_response(call.request, values, ctx)
+        else:
+            score = 42 if call.is_admin else next(scores)
+            results[i] = online_score_response(score, call.arguments, ctx)
+    return results
+
+
+def score_chunk(lines, store) -> Tuple[bytes, int, int]:
+    results = process_chunk(lines, store)
+    payload = b"".join(codec.dumps(make_envelope(response, code)) + b"\n"
+                       for response, code in results)
+    return payload, len(results), sum(code != OK for _, code in results)
+
+
+def warm_chunk(lines, store) -> Tuple[int, int]:
+    items = []
+    for line in lines:
+        try:
+            items.append(score_arguments(OnlineScoreRequest(codec.loads(line))))
+        except Exception:
+            continue
+    get_scores_batch(store, items)
+    return len(items), len(lines) - len(items)
+
+
+def ordered(pool, fn, chunks, window) -> Iterator:
+    pending: Deque[Future] = deque()
+    for chunk in chunks:
+        pending.append(pool.submit(fn, chunk))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _init_worker(store_factory, codec_backend, key_namespace, legacy_key_reads,
+                 score_options):
+    global _store
+    codec.use(codec_backend)
+    cache_keys.configure(key_namespace, legacy_key_reads)
+    score_policy.configure(**score_options)
+    _store = store_factory()
+
+
+def _score_chunk(lines):
+    return score_chunk(lines, _store)
+
+
+def _warm_chunk(lines):
+    return warm_chunk(lines, _store)
+
+
+class ScoringEngine:
+    def __init__(self, store_factory: Callable, processes: int = 0,
+                 workers: int = WORKERS, chunk_size: int = CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self._pool: Executor
+        if processes > 0:
+            self.window = processes * 2
+            self._pool = ProcessPoolExecutor(
+                max_workers=processes,
+                initializer=_init_worker,
+                initargs=(store_factory, codec.backend, cache_keys.namespace,
+                          cache_keys.legacy_reads, score_policy.options())
+            )
+            self._score, self._warm = _score_chunk, _warm_chunk
+        else:
+            store = store_factory()
+            self.window = workers * 2
+            self._pool = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix="batch-worker")
+            self._score = partial(score_chunk, store=store)
+            self._warm = partial(warm_chunk, store=store)
+
+    def score(self, lines: Iterable[bytes]) -> Iterator[Tuple[bytes, int, int]]:
+        chunks = chunked(lines, self.chunk_size)
+        return ordered(self._pool, self._score, chunks, self.window)
+
+    def warm(self, lines: Iterable[bytes]) -> Tuple[int, int]:
+        warmed = skipped = 0
+        chunks = chunked(lines, self.chunk_size)
+        for chunk_warmed, chunk_skipped in ordered(self._pool, self._warm, chunks,
+                                                   self.window):
+            warmed += chunk_warmed
+            skipped += chunk_skipped
+        return warmed, skipped
+
+    def close(self):
+        self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def score_file(engine, input_path, output_path):
+    source = sys.stdin.buffer if input_path == '-' else open(input_path, 'rb')
+    target = sys.stdout.buffer if output_path == '-' else open(output_path, 'wb')
+
+    processed = errors = 0
+    started = time.monotonic()
+    try:
+        for payload, count, failed in engine.score(read_lines(source)):
+            target.write(payload)
+            processed += count
+            errors += failed
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+        if target is not sys.stdout.buffer:
+            target.close()
+
+    elapsed = time.monotonic() - started
+    logging.info(f"Processed {processed} requests ({errors} errors) in {elapsed:.1f}s, "
+                 f"{processed / elapsed if elapsed else 0:.0f} requests/s")
+
+
+def make_store(redis_nodes, max_connections):
+    nodes = [Store(host, port, db, max_connections=max_connections)
+             for host, port, db in map(parse_node, redis_nodes)]
+    return nodes[0] if len(nodes) == 1 else ShardedStore(nodes)
+
+
+def main(argv=None):
+    parser = ArgumentParser(prog='scoring-api batch',
+                            description='Score a JSONL file of method requests, '
+                                        'writing JSONL results')
+    parser.add_argument('input', nargs='?',
+                        help='JSONL file with one method request per line '
+                             '("-" for stdin)')
+    parser.add_argument('-o', '--output', default='-',
+                        help='Where to write JSONL results ("-" for stdout)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help='Requests per chunk; each chunk reads and writes Redis '
+                             'in one pipeline')
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help='Chunks processed concurrently by threads')
+    parser.add_argument('--processes', type=int, default=0,
+                        help='Worker processes, each with its own Store pool '
+                             '(0 - threads in this process)')
+    parser.add_argument('--prewarm', metavar='FILE',
+                        help='JSONL file of online_score arguments to precompute '
+                             'into the score cache first')
+    parser.add_argument('--json-codec', choices=['auto'] + list(codec.FACTORIES),
+                        default='auto',
+                        help='JSON backend for request parsing and result encoding')
+    parser.add_argument('--redis-nodes', default=default_redis_nodes(),
+                        help='Comma-separated host:port[/db] list; '
+                             'several nodes are consistent-hashed '
+                             '(default: $SCORING_REDIS_NODES '
+                             'or $REDIS_HOST:$REDIS_PORT/$REDIS_DB)')
+    parser.add_argument('--max-connections', type=int, default=50,
+                        help='Max Redis connections in the pool of each process')
+    args = parser.parse_args(argv)
+    if not args.input and not args.prewarm:
+        parser.error("nothing to do: pass an input file and/or --prewarm")
+
+    codec.use(args.json_codec)
+    store_factory = partial(make_store, args.redis_nodes.split(','),
+                            args.max_connections)
+    with ScoringEngine(store_factory, args.processes, args.workers,
+                       args.chunk_size) as engine:
+        if args.prewarm:
+            started = time.monotonic()
+            with open(args.prewarm, 'rb') as source:
+                warmed, skipped = engine.warm(read_lines(source))
+            logging.info(f"Warmed score cache for {warmed} identities "
+                         f"({skipped} invalid) in {time.monotonic() - started:.1f}s")
+        if args.input:
+            score_file(engine, args.input, args.output)
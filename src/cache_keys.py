@@ -0,0 +1,62 @@
+import base64
+import hashlib
+import os
+
+KEY_VERSION = 2
+DIGEST_SIZE = 16
+DEFAULT_NAMESPACE = "s"
+SEPARATOR = "\x1f"
+
+namespace = os.environ.get("SCORING_KEY_NAMESPACE", DEFAULT_NAMESPACE)
+legacy_reads = os.environ.get("SCORING_LEGACY_KEY_READS", "1") != "0"
+_prefix = f"{namespace}{KEY_VERSION}:"
+
+
+def check_namespace(key_namespace):
+    if not key_namespace or ":" in key_namespace:
+        raise ValueError("Key namespace must be a non-empty string without ':'")
+    return key_namespace
+
+
+def configure(key_namespace=None, legacy_key_reads=None):
+    global namespace, legacy_reads, _prefix
+    if key_namespace is not None:
+        namespace = check_namespace(key_namespace)
+    if legacy_key_reads is not None:
+        legacy_reads = legacy_key_reads
+    _prefix = f"{namespace}{KEY_VERSION}:"
+
+
+def normalize_score_fields(phone=None, email=None, birthday=None,
+                           gender=None, first_name=None, last_name=None):
+    return SEPARATOR.join((
+        str(phone) if phone else "",
+        email.lower() if email else "",
+        birthday.isoformat() if birthday else "",
+        str(gender) if gender is not None else "",
+        first_name or "",
+        last_name or "",
+    ))
+
+
+def score_cache_key(phone=None, email=None, birthday=None,
+                    gender=None, first_name=None, last_name=None, key_namespace=None):
+    normalized = normalize_score_fields(phone, email, birthday, gender,
+                                        first_name, last_name)
+    digest = hashlib.blake2b(normalized.encode('utf-8'), digest_size=DIGEST_SIZE)
+    prefix = _prefix if key_namespace is None else f"{key_namespace}{KEY_VERSION}:"
+    encoded = base64.urlsafe_b64encode(digest.digest()).rstrip(b"=")
+    return prefix + encoded.decode('ascii')
+
+
+def legacy_score_cache_key(phone=None, email=None, birthday=None,
+                           gender=None, first_name=None, last_name=None):
+    cache_key_parts = [
+        str(phone) if phone else "",
+        email or "",
+        f"{birthday.strftime('%Y%m%d')}" if birthday else "",
+        str(gender) if gender is not None else "",
+        first_name or "",
+        last_name or ""
+    ]
+    return "uid:" + ":".join(cache_key_parts)
@@ -0,0 +1,163 @@
+import hashlib
+import random
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from src.cache_keys import check_namespace
+from src.local_cache import LocalCache
+
+SCORE_TTL = 60 * 60  # cache for 1 hour
+TTL_JITTER = 0.1
+STALE_WINDOW = 5 * 60
+SEPARATOR = ";"
+INVALID_TTL = 10
+INVALID_MAX_VALUE_SIZE = 4096
+NEGATIVE_CACHE_SIZE = 10000
+
+
+def _flag(value: str) -> bool:
+    value = value.lower()
+    if value in ("1", "on", "true", "yes"):
+        return True
+    if value in ("0", "off", "false", "no"):
+        return False
+    raise ValueError(f"Invalid flag value {value!r}")
+
+
+OPTIONS: Dict[str, Callable[[str], Any]] = {
+    "ttl": float, "jitter": float, "stale": float, "enabled": _flag, "l1": _flag,
+    "max_value_size": int, "namespace": check_namespace,
+}
+
+
+class CachePolicy:
+    def __init__(self, ttl: float, jitter: float = TTL_JITTER,
+                 stale: float = STALE_WINDOW, enabled: bool = True, l1: bool = True,
+                 max_value_size: int = 0,
+                 clock=time.time, rng=random.random):
+        # None keeps the global cache_keys namespace (--key-namespace)
+        self.namespace: Optional[str] = None
+        self.configure(ttl, jitter, stale, enabled, l1, max_value_size)
+        self._clock = clock
+        self._rng = rng
+
+    def configure(self, ttl=None, jitter=None, stale=None, enabled=None, l1=None,
+                  max_value_size=None, namespace=None):
+        if ttl is not None:
+            if ttl <= 0:
+                raise ValueError("ttl must be positive")
+            self.ttl = ttl
+        if jitter is not None:
+            if not 0 <= jitter < 1:
+                raise ValueError("jitter must be in [0, 1)")
+            self.jitter = jitter
+        if stale is not None:
+            if stale < 0:
+                raise ValueError("stale window must not be negative")
+            self.stale = stale
+        if enabled is not None:
+            self.enabled = enabled
+        if l1 is not None:
+            self.l1 = l1
+        if max_value_size is not None:
+            if max_value_size < 0:
+                raise ValueError("max_value_size must not be negative")
+            self.max_value_size = max_value_size
+        if namespace is not None:
+            self.namespace = check_namespace(namespace)
+
+    def options(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in OPTIONS}
+
+    def fits(self, value) -> bool:
+        return not self.max_value_size or len(value) <= self.max_value_size
+
+    def _fresh_ttl(self) -> float:
+        return self.ttl * (1 + self.jitter * (2 * self._rng() - 1))
+
+    def _encode(self, value: Any, fresh_ttl: float) -> str:
+        if not self.stale:
+            return str(value)
+        return f"{value}{SEPARATOR}{int(self._clock() + fresh_ttl)}"
+
+    def entry(self, value: Any) -> Optional[Tuple[str, int]]:
+        fresh_ttl = self._fresh_ttl()
+        encoded = self._encode(value, fresh_ttl)
+        if not self.fits(encoded):
+            return None
+        return encoded, int(fresh_ttl + self.stale) + 1
+
+    def entries(self, mapping: Dict[str, Any]) -> Tuple[Dict[str, str], Dict[str, int]]:
+        # every key gets its own jittered TTL,
+        # so a batch written at once does not expire at once
+        encoded, expire = {}, {}
+        for key, value in mapping.items():
+            entry = self.entry(value)
+            if entry is not None:
+                encoded[key], expire[key] = entry
+        return encoded, expire
+
+    def decode(self, raw) -> Tuple[bytes, bool]:
+        if isinstance(raw, str):
+            raw = raw.encode()
+        value, separator, soft_expires_at = raw.partition(SEPARATOR.encode())
+        if not separator:
+            return value, False
+        return value, int(soft_expires_at) <= self._clock()
+
+
+class NegativeCache:
+    def __init__(self, policy: CachePolicy, max_size: int = NEGATIVE_CACHE_SIZE):
+        self.policy = policy
+        self._cache = LocalCache(max_size=max_size, ttl=float("inf"))
+
+    @staticmethod
+    def key(path: str, body: bytes) -> bytes:
+        digest = hashlib.blake2b(path.strip("/").encode('utf-8'), digest_size=16)
+        digest.update(b"\n")
+        digest.update(body)
+        return digest.digest()
+
+    def get(self, key: bytes) -> Optional[Tuple[str, bytes]]:
+        if not self.policy.enabled:
+            return None
+        return self._cache.get(key)
+
+    def add(self, key: bytes, method: str, payload: bytes) -> None:
+        if self.policy.enabled and self.policy.fits(payload):
+            self._cache.set(key, (method, payload), self.policy.ttl)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+score_policy = CachePolicy(SCORE_TTL)
+invalid_policy = CachePolicy(INVALID_TTL, jitter=0, stale=0,
+                             max_value_size=INVALID_MAX_VALUE_SIZE)
+
+# online_score_batch reads and writes the same keys as online_score,
+# so both share one policy
+POLICIES = {
+    "online_score": score_policy,
+    "invalid": invalid_policy,
+}
+
+invalid_requests = NegativeCache(invalid_policy)
+
+
+def configure_policy(spec: str) -> CachePolicy:
+    name, _, options = spec.partition(":")
+    try:
+        policy = POLICIES[name]
+    except KeyError:
+        raise ValueError(f"Unknown cache policy {name!r}, "
+                         f"expected one of {', '.join(POLICIES)}") from None
+
+    kwargs = {}
+    for option in filter(None, options.split(",")):
+        option, _, value = option.partition("=")
+        if option not in OPTIONS:
+            raise ValueError(f"Unknown cache policy option {option!r}")
+        kwargs[option] = OPTIONS[option](value)
+    policy.configure(**kwargs)
+    return policy
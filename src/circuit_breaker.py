@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import redis
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(redis.ConnectionError):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 5.0,
+        probe: Optional[Callable[[], bool]] = None,
+        probe_interval: float = 1.0,
+        name: str = "store",
+        on_state_change: Optional[Callable[[str, str], None]] = None,
+        clock=time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.probe = probe
+        self.probe_interval = probe_interval
+        self.name = name
+        self.on_state_change = on_state_change
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._trial_started = 0.0
+        self._probe_thread: Optional[threading.Thread] = None
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            now = self._clock()
+            if self._state == OPEN and now - self._opened_at >= self.recovery_timeout:
+                self._set_state(HALF_OPEN)
+            if self._state == HALF_OPEN and (
+                not self._trial_in_flight
+                or now - self._trial_started >= self.recovery_timeout
+            ):
+                self._trial_in_flight = True
+                self._trial_started = now
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        if not self._failures and self._state == CLOSED:
+            return
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            if self._state != CLOSED:
+                self._set_state(CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.opened += 1
+                    self._set_state(OPEN)
+                self._opened_at = self._clock()
+                self._start_probe()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "state": self._state,
+            "failures": self._failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+    def _set_state(self, state: str) -> None:
+        previous, self._state = self._state, state
+        logging.warning(f"Circuit breaker {self.name}: {previous} -> {state}")
+        if self.on_state_change is not None:
+            self.on_state_change(self.name, state)
+
+    def _start_probe(self) -> None:
+        if self.probe is None or (
+            self._probe_thread is not None and self._probe_thread.is_alive()
+        ):
+            return
+        self._probe_thread = threading.Thread(
+            target=self._run_probe, args=(self.probe,), name=f"{self.name}-probe",
+            daemon=True,
+        )
+        self._probe_thread.start()
+
+    def _run_probe(self, probe: Callable[[], bool]) -> None:
+        while self._state != CLOSED:
+            time.sleep(self.probe_interval)
+            try:
+                healthy = probe()
+            except Exception:
+                healthy = False
+            if healthy:
+                self.record_success()
+                return
@@ -0,0 +1,64 @@
+import json
+import os
+from typing import Any, Callable, Dict, Tuple
+
+
+def _stdlib_codec() -> Tuple[Callable[[bytes], Any], Callable[[Any], bytes]]:
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode('utf-8')
+    return json.loads, dumps
+
+
+def _orjson_codec():
+    import orjson
+    return orjson.loads, orjson.dumps
+
+
+def _msgspec_codec():
+    import msgspec
+    encoder = msgspec.json.Encoder()
+    decoder = msgspec.json.Decoder()
+    return decoder.decode, encoder.encode
+
+
+FACTORIES: Dict[str, Callable] = {
+    "orjson": _orjson_codec,
+    "msgspec": _msgspec_codec,
+    "json": _stdlib_codec,
+}
+
+backend = "json"
+loads, dumps = _stdlib_codec()
+
+
+def available():
+    names = []
+    for name, factory in FACTORIES.items():
+        try:
+            factory()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def get(name: str):
+    return FACTORIES[name]()
+
+
+def use(name: str = "auto") -> str:
+    global backend, loads, dumps
+    candidates = list(FACTORIES) if name == "auto" else [name]
+    for candidate in candidates:
+        try:
+            loads, dumps = get(candidate)
+        except ImportError:
+            if name != "auto":
+                raise
+            continue
+        backend = candidate
+        return backend
+    return backend
+
+
+use(os.environ.get("SCORING_JSON_CODEC", "auto"))
@@ -1,91 +1,398 @@
-import json
 import logging
+import select
+import time
 import uuid
+from collections import namedtuple
+from itertools import chain
 from http.server import BaseHTTPRequestHandler
 
-from src.api_requests import check_auth, Request, OnlineScoreRequest, ClientsInterestsRequest
-from src.scoring_service import get_score, get_interests
-from src.store import Store
+from src import codec
+from src.admission import DeadlineExceeded, start_deadline, deadline_scope, expired
+from src.api_requests import check_auth, Request, OnlineScoreRequest, \
+    ClientsInterestsRequest, OnlineScoreBatchRequest, METHODS, ADMIN_LOGIN, \
+    authenticator
+from src.cache_policy import invalid_requests
+from src.metrics import REGISTRY, REQUESTS_TOTAL, REQUESTS_SHED_TOTAL, \
+    INVALID_CACHE_HITS_TOTAL, stage, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from src.scoring_service import get_score, get_interests, get_interests_batch, \
+    get_scores_batch
 
 OK = 200
 BAD_REQUEST = 400
 FORBIDDEN = 403
 NOT_FOUND = 404
+PAYLOAD_TOO_LARGE = 413
 INVALID_REQUEST = 422
 INTERNAL_ERROR = 500
+SERVICE_UNAVAILABLE = 503
+DEADLINE_EXCEEDED = 504
+IDLE_TIMEOUT = 15
+IDLE_POLL_INTERVAL = 0.05
+MAX_REQUESTS_PER_CONNECTION = 1000
+MAX_BODY_SIZE = 1024 * 1024
+MAX_IN_FLIGHT = 0
+REQUEST_TIMEOUT = 5.0
+STREAM_THRESHOLD = 1000
+STREAM_BATCH_SIZE = 500
+STREAM_HEAD = b'{"code": 200, "response": {'
+STREAM_TAIL = b'}, "error": null}'
+
 ERRORS = {
     BAD_REQUEST: "Bad Request",
     FORBIDDEN: "Forbidden",
     NOT_FOUND: "Not Found",
+    PAYLOAD_TOO_LARGE: "Payload Too Large",
     INVALID_REQUEST: "Invalid Request",
     INTERNAL_ERROR: "Internal Server Error",
+    SERVICE_UNAVAILABLE: "Service Unavailable",
+    DEADLINE_EXCEEDED: "Deadline Exceeded",
 }
 
 
-def method_handler(request_dict, ctx, store):
-    try:
-        body = request_dict.get("body", {})
+MethodCall = namedtuple("MethodCall", ["method", "request", "arguments", "is_admin"])
 
-        if not body:
-            return {"error": "Empty request"}, INVALID_REQUEST
 
-        if not check_auth(request_dict):
-            return {"error": "Authentication failed"}, FORBIDDEN
+def method_label(method):
+    return method if method in METHODS else "unknown"
 
-        method = body.get("method")
-        arguments = body.get("arguments", {})
 
-        if not method:
-            return {"error": "Method is required"}, INVALID_REQUEST
+def validate_method_request(request_dict, ctx=None):
+    body = request_dict.get("body", {})
 
-        if method == 'clients_interests':
-            if not isinstance(arguments.get("client_ids"), list) or not arguments.get("client_ids"):
-                return {"error": "client_ids must be non-empty list"}, INVALID_REQUEST
+    if not body:
+        return None, ({"error": "Empty request"}, INVALID_REQUEST)
+    if not isinstance(body, dict):
+        return None, ({"error": "Request body must be an object"}, INVALID_REQUEST)
 
-            try:
-                request = ClientsInterestsRequest(arguments)
-            except ValueError as e:
-                return {"error": str(e)}, INVALID_REQUEST
+    method = body.get("method")
+    label = method_label(method)
 
-            interests = {}
-            for cid in request.client_ids:
-                interests[str(cid)] = get_interests(store, cid)
-            ctx["nclients"] = len(interests)
-            return interests, OK
+    with stage("auth", label, ctx):
+        authorized = check_auth(request_dict)
+    if not authorized:
+        return None, ({"error": "Authentication failed"}, FORBIDDEN)
 
-        elif method == 'online_score':
-            try:
-                request = OnlineScoreRequest(arguments)
-            except ValueError as e:
-                return {"error": str(e)}, INVALID_REQUEST
+    with stage("validate", label, ctx):
+        return validate_arguments(request_dict, method, body.get("arguments", {}))
+
+
+def validate_arguments(request_dict, method, arguments):
+    if not method:
+        return None, ({"error": "Method is required"}, INVALID_REQUEST)
+    if not isinstance(arguments, dict):
+        return None, ({"error": "arguments must be an object"}, INVALID_REQUEST)
+
+    if method == 'clients_interests':
+        client_ids = arguments.get("client_ids")
+        if not isinstance(client_ids, list) or not client_ids:
+            error = {"error": "client_ids must be non-empty list"}
+            return None, (error, INVALID_REQUEST)
+
+        try:
+            request = ClientsInterestsRequest(arguments)
+        except ValueError as e:
+            return None, ({"error": str(e)}, INVALID_REQUEST)
+
+        return MethodCall(method, request, arguments, False), None
+
+    elif method == 'online_score':
+        try:
+            request = OnlineScoreRequest(arguments)
+            is_admin = Request(request_dict).is_admin
+        except ValueError as e:
+            return None, ({"error": str(e)}, INVALID_REQUEST)
+
+        return MethodCall(method, request, arguments, is_admin), None
+
+    elif method == 'online_score_batch':
+        try:
+            request = OnlineScoreBatchRequest(arguments)
+            is_admin = Request(request_dict).is_admin
+        except ValueError as e:
+            return None, ({"error": str(e)}, INVALID_REQUEST)
+
+        return MethodCall(method, request, arguments, is_admin), None
+
+    return None, ({"error": "Unknown method"}, NOT_FOUND)
 
-            if Request(request_dict).is_admin:
-                score = 42
-            else:
-                score = get_score(
-                    store,
-                    phone=request.phone,
-                    email=request.email,
-                    first_name=request.first_name,
-                    last_name=request.last_name,
-                    gender=request.gender,
-                    birthday=request.birthday,
-                )
-
-            ctx["has"] = [k for k, v in arguments.items() if v]
-            return {"score": score}, OK
 
+def score_arguments(request):
+    return {
+        "phone": request.phone,
+        "email": request.email,
+        "first_name": request.first_name,
+        "last_name": request.last_name,
+        "gender": request.gender,
+        "birthday": request.birthday,
+    }
+
+
+def clients_interests_response(interests, ctx):
+    ctx["nclients"] = len(interests)
+    return {str(cid): value for cid, value in interests.items()}, OK
+
+
+def online_score_response(score, arguments, ctx):
+    ctx["has"] = [k for k, v in arguments.items() if v]
+    return {"score": score}, OK
+
+
+def streams_interests(ctx, client_ids):
+    return 0 < ctx.get("stream_threshold", 0) < len(client_ids)
+
+
+class InterestsStream:
+    def __init__(self, store, client_ids, ctx, batch_size=STREAM_BATCH_SIZE):
+        self.store = store
+        self.client_ids = list(dict.fromkeys(client_ids))
+        self.ctx = ctx
+        self.batch_size = batch_size
+        ctx["nclients"] = len(self.client_ids)
+
+    def _batches(self):
+        for start in range(0, len(self.client_ids), self.batch_size):
+            yield self.client_ids[start:start + self.batch_size]
+
+    @staticmethod
+    def _entries(interests):
+        return codec.dumps({str(cid): value for cid, value in interests.items()})[1:-1]
+
+    def chunks(self, fetch):
+        separator = STREAM_HEAD
+        for batch in self._batches():
+            yield separator + self._entries(fetch(self.store, batch))
+            separator = b", "
+        yield STREAM_TAIL
+
+    async def chunks_async(self, fetch):
+        separator = STREAM_HEAD
+        for batch in self._batches():
+            yield separator + self._entries(await fetch(self.store, batch))
+            separator = b", "
+        yield STREAM_TAIL
+
+
+def chunk_frame(chunk):
+    return b"%x\r\n%s\r\n" % (len(chunk), chunk)
+
+
+def valid_batch_items(request):
+    return [item for item in request.requests if not isinstance(item, ValueError)]
+
+
+def online_score_batch_response(request, scores, ctx):
+    scores = iter(scores)
+    results = []
+    for item in request.requests:
+        if isinstance(item, ValueError):
+            results.append({"error": str(item)})
         else:
-            return {"error": "Unknown method"}, NOT_FOUND
+            results.append({"score": next(scores)})
+    ctx["nitems"] = len(results)
+    ctx["nerrors"] = len(results) - len(valid_batch_items(request))
+    return {"scores": results}, OK
+
 
+def make_envelope(response, code):
+    return {
+        "code": code,
+        "response": response if code == OK else None,
+        "error": ERRORS.get(code, "Unknown Error") if code != OK else None
+    }
+
+
+def overloaded_response():
+    payload = codec.dumps(make_envelope({}, SERVICE_UNAVAILABLE))
+    return (
+        f"HTTP/1.1 {SERVICE_UNAVAILABLE} {ERRORS[SERVICE_UNAVAILABLE]}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(payload)}\r\n"
+        f"Retry-After: 1\r\n"
+        f"Connection: close\r\n"
+        f"\r\n".encode('latin-1') + payload
+    )
+
+
+def deadline_exceeded(ctx):
+    REQUESTS_SHED_TOTAL.inc("deadline")
+    logging.warning(f"Request {ctx.get('request_id')} dropped: deadline exceeded")
+    return {"error": "Deadline exceeded"}, DEADLINE_EXCEEDED
+
+
+def method_handler(request_dict, ctx, store):
+    try:
+        call, error = validate_method_request(request_dict, ctx)
+        if error:
+            return error
+        if expired(ctx):
+            return deadline_exceeded(ctx)
+
+        with stage("compute", call.method, ctx):
+            if call.method == 'clients_interests':
+                if streams_interests(ctx, call.request.client_ids):
+                    return InterestsStream(store, call.request.client_ids, ctx), OK
+                interests = get_interests_batch(store, call.request.client_ids)
+                return clients_interests_response(interests, ctx)
+
+            if call.method == 'online_score_batch':
+                items = valid_batch_items(call.request)
+                if call.is_admin:
+                    scores = [42] * len(items)
+                else:
+                    scores = get_scores_batch(
+                        store, [score_arguments(item) for item in items]
+                    )
+                return online_score_batch_response(call.request, scores, ctx)
+
+            if call.is_admin:
+                score = 42
+            else:
+                score = get_score(store, **score_arguments(call.request))
+            return online_score_response(score, call.arguments, ctx)
+
+    except DeadlineExceeded:
+        return deadline_exceeded(ctx)
     except Exception as e:
         logging.exception("Handler error")
         return {"error": "Internal error"}, INTERNAL_ERROR
 
 
+def preload(store, identities=None):
+    started = time.monotonic()
+    body = {"account": "", "login": ADMIN_LOGIN, "token": authenticator.admin_digest(),
+            "method": "online_score",
+            "arguments": {"phone": "79175002040", "email": "preload@otus.ru"}}
+    response, code = method_handler({"body": body, "headers": {}}, {}, store)
+    codec.dumps(make_envelope(response, code))
+
+    warmed = 0
+    if store is not None:
+        store.ping()
+        if identities:
+            from src.batch import CHUNK_SIZE, chunked, read_lines, warm_chunk
+            with open(identities, 'rb') as source:
+                for chunk in chunked(read_lines(source), CHUNK_SIZE):
+                    warmed += warm_chunk(chunk, store)[0]
+    elapsed = time.monotonic() - started
+    logging.info(f"Preloaded in {elapsed:.3f}s, warmed {warmed} scores")
+
+
 class MainHTTPHandler(BaseHTTPRequestHandler):
     router = {"method": method_handler}
-    store= Store()
+    store = None
+    protocol_version = "HTTP/1.1"
+    timeout = IDLE_TIMEOUT
+    idle_poll_interval = IDLE_POLL_INTERVAL
+    disable_nagle_algorithm = True
+    max_requests_per_connection = MAX_REQUESTS_PER_CONNECTION
+    max_body_size = MAX_BODY_SIZE
+    request_timeout = REQUEST_TIMEOUT
+    stream_threshold = STREAM_THRESHOLD
+    overloaded_response = staticmethod(overloaded_response)
+
+    def setup(self):
+        super().setup()
+        self.requests_served = 0
+
+    def handle(self):
+        # the slot taken when the connection was accepted covers its first request
+        self.close_connection = True
+        self.handle_one_request()
+        self.release_slot()
+        while not self.close_connection and self.wait_for_request():
+            self.handle_one_request()
+            self.release_slot()
+
+    def release_slot(self):
+        release = getattr(self.server, "release_slot", None)
+        if release is not None:
+            release(self.request)
+
+    def acquire_slot(self):
+        acquire = getattr(self.server, "acquire_slot", None)
+        if acquire is None or acquire(self.request):
+            return True
+        self.server.reject_request(self.request)
+        return False
+
+    def server_busy(self):
+        # another connection waits for this worker
+        # (or, when serving serially, to be accepted)
+        busy = getattr(self.server, "busy", None)
+        return busy is not None and busy()
+
+    def request_pending(self):
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return True
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def wait_for_request(self):
+        if self.request_pending():
+            return self.acquire_slot()
+
+        # an idle keep-alive connection gives its worker up
+        # as soon as another connection needs it
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while not self.server_busy():
+            left = self.idle_poll_interval
+            if deadline is not None:
+                left = min(left, deadline - time.monotonic())
+                if left <= 0:
+                    return False
+            if select.select([self.connection], [], [], left)[0]:
+                return self.acquire_slot()
+        return False
+
+    def start_response(self, code, content_type, length=None):
+        self.requests_served += 1
+        limit_reached = self.requests_served >= self.max_requests_per_connection
+        if limit_reached or self.server_busy():
+            self.close_connection = True
+
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        if length is None:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Content-Length", str(length))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+
+    def send_payload(self, code, payload, content_type="application/json"):
+        self.start_response(code, content_type, len(payload))
+        self.wfile.write(payload)
+
+    def send_stream(self, stream):
+        chunks = stream.chunks(get_interests_batch)
+        try:
+            first = next(chunks)
+        except DeadlineExceeded:
+            response, code = deadline_exceeded(stream.ctx)
+            self.send_payload(code, codec.dumps(make_envelope(response, code)))
+            return code
+        except Exception:
+            logging.exception("Interests stream failed")
+            payload = codec.dumps(make_envelope({}, INTERNAL_ERROR))
+            self.send_payload(INTERNAL_ERROR, payload)
+            return INTERNAL_ERROR
+
+        self.start_response(OK, "application/json")
+        try:
+            for chunk in chain((first,), chunks):
+                self.wfile.write(chunk_frame(chunk))
+        except Exception:
+            # the status line is already sent:
+            # drop the connection so the client sees a truncated body
+            logging.exception("Interests stream aborted")
+            self.close_connection = True
+            return INTERNAL_ERROR
+        self.wfile.write(b"0\r\n\r\n")
+        return OK
 
     def get_request_id(self, headers):
         return headers.get('X-Request-ID', uuid.uuid4().hex)
@@ -93,39 +400,92 @@ class MainHTTPHandler(BaseHTTPRequestHandler):
     def do_POST(self):
         response, code = {}, OK
         context = {"request_id": self.get_request_id(self.headers)}
+        start_deadline(context, self.request_timeout)
+        if self.request_version == "HTTP/1.1":
+            context["stream_threshold"] = self.stream_threshold
         request = None
+        method = ""
+        invalid_key = None
 
         try:
-            content_length = int(self.headers.get('Content-Length', 0))
-            request = json.loads(self.rfile.read(content_length))
-
+            with stage("read_body", ctx=context):
+                content_length = int(self.headers.get('Content-Length', 0))
+                if content_length < 0:
+                    raise ValueError(f"Invalid Content-Length {content_length}")
+                if content_length > self.max_body_size:
+                    code = PAYLOAD_TOO_LARGE
+                    REQUESTS_SHED_TOTAL.inc("body_too_large")
+                else:
+                    raw_body = self.rfile.read(content_length)
         except Exception:
             code = BAD_REQUEST
 
+        if code != OK:
+            self.close_connection = True
+        else:
+            invalid_key = invalid_requests.key(self.path, raw_body)
+            rejected = invalid_requests.get(invalid_key)
+            if rejected:
+                method, payload = rejected
+                INVALID_CACHE_HITS_TOTAL.inc(method)
+                REQUESTS_TOTAL.inc(method, str(INVALID_REQUEST))
+                self.send_payload(INVALID_REQUEST, payload)
+                return
+            try:
+                with stage("decode", ctx=context):
+                    request = codec.loads(raw_body)
+            except Exception:
+                code = BAD_REQUEST
+
         if request:
             try:
                 request_body = request.get('body', {})
                 headers = request.get('headers', {})
+                method = method_label(request_body.get('method'))
                 path = self.path.strip("/")
                 if path in self.router:
-                    response, code = self.router[path]({"body": request_body, "headers": headers}, context, self.store)
+                    with stage("handle", method, context), deadline_scope(context):
+                        response, code = self.router[path](
+                            {"body": request_body, "headers": headers},
+                            context,
+                            self.store,
+                        )
                 else:
                     code = NOT_FOUND
             except Exception as e:
                 logging.error(f"Request failed: {str(e)}")
                 code = INTERNAL_ERROR if code == OK else code
 
-        self.send_response(code)
-        self.send_header("Content-Type", "application/json")
-        self.end_headers()
-        response_data = {
-            "code": code,
-            "response": response if code == OK else None,
-            "error": ERRORS.get(code, "Unknown Error") if code != OK else None
-        }
-        self.wfile.write(json.dumps(response_data).encode('utf-8'))
+        if isinstance(response, InterestsStream):
+            with stage("write", method, context), deadline_scope(context):
+                code = self.send_stream(response)
+            REQUESTS_TOTAL.inc(method, str(code))
+            logging.debug(f"Request {context['request_id']} {method} {code} "
+                          f"timings={context.get('timings')}")
+            return
+
+        with stage("encode", method, context):
+            payload = codec.dumps(make_envelope(response, code))
+        if code == INVALID_REQUEST and invalid_key is not None:
+            invalid_requests.add(invalid_key, method, payload)
+        REQUESTS_TOTAL.inc(method, str(code))
+        with stage("write", method, context):
+            self.send_payload(code, payload)
+
+        logging.debug(
+            f"Request {context['request_id']} {method} {code} "
+            f"timings={context.get('timings')}"
+        )
         return
 
+    def do_GET(self):
+        if self.path.split("?")[0].strip("/") == "metrics":
+            payload, code, content_type = REGISTRY.render(), OK, METRICS_CONTENT_TYPE
+        else:
+            payload = codec.dumps(make_envelope({}, NOT_FOUND))
+            code, content_type = NOT_FOUND, "application/json"
+        self.send_payload(code, payload, content_type)
+
 
 def handle_online_score(request, arguments, context):
     if request.is_admin:
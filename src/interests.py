@@ -0,0 +1,126 @@
+import logging
+from argparse import ArgumentParser
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_INTERESTS = ["cars", "pets", "travel", "hi-tech",
+                     "sport", "music", "books", "tv",
+                     "cinema", "geek", "otus"]
+INTERESTS_KEY_PREFIX = "ib:"
+LEGACY_KEY_PREFIX = "i:"
+BUCKET_SIZE = 100  # keeps every bucket hash below hash-max-listpack-entries (128)
+
+_BITS = {interest: 1 << i for i, interest in enumerate(DEFAULT_INTERESTS)}
+_DECODED = [tuple(interest for interest, bit in _BITS.items() if mask & bit)
+            for mask in range(1 << len(DEFAULT_INTERESTS))]
+
+
+def encode_interests(interests: Iterable[str]) -> int:
+    mask = 0
+    for interest in interests:
+        try:
+            mask |= _BITS[interest]
+        except KeyError:
+            raise ValueError(f"Unknown interest {interest!r}") from None
+    return mask
+
+
+def decode_interests(mask) -> List[str]:
+    return list(_DECODED[int(mask)])
+
+
+def interests_location(cid: int) -> Tuple[str, str]:
+    bucket, offset = divmod(cid, BUCKET_SIZE)
+    return f"{INTERESTS_KEY_PREFIX}{bucket}", str(offset)
+
+
+def group_fields(cids: Iterable[int]) -> Dict[str, List[str]]:
+    buckets: Dict[str, List[str]] = {}
+    for cid in cids:
+        key, field = interests_location(cid)
+        buckets.setdefault(key, []).append(field)
+    return buckets
+
+
+def group_masks(masks: Dict[int, int]) -> Dict[str, Dict[str, int]]:
+    buckets: Dict[str, Dict[str, int]] = {}
+    for cid, mask in masks.items():
+        key, field = interests_location(cid)
+        buckets.setdefault(key, {})[field] = mask
+    return buckets
+
+
+def masks_by_cid(cids: List[int], fields: Dict[str, List[str]],
+                 values: Dict[str, List[Optional[bytes]]]) -> List[Optional[bytes]]:
+    by_location = {key: dict(zip(fields[key], values[key])) for key in fields}
+    masks = []
+    for cid in cids:
+        key, field = interests_location(cid)
+        masks.append(by_location[key][field])
+    return masks
+
+
+def convert_legacy_interests(
+    client, batch_size: int = 1000, delete: bool = False
+) -> Dict[str, int]:
+    stats = {"converted": 0, "skipped": 0}
+    keys: List[str] = []
+
+    def flush():
+        values = client.mget(keys)
+        masks, converted_keys = {}, []
+        for key, value in zip(keys, values):
+            if value is None:
+                continue
+            try:
+                cid = int(key[len(LEGACY_KEY_PREFIX):])
+                masks[cid] = encode_interests(value.decode().split(","))
+            except ValueError as e:
+                logging.warning(f"Skipping {key}: {e}")
+                stats["skipped"] += 1
+                continue
+            converted_keys.append(key)
+
+        pipe = client.pipeline(transaction=False)
+        for bucket, mapping in group_masks(masks).items():
+            pipe.hset(bucket, mapping=mapping)
+        if delete and converted_keys:
+            pipe.delete(*converted_keys)
+        pipe.execute()
+        stats["converted"] += len(converted_keys)
+        keys.clear()
+
+    for key in client.scan_iter(match=f"{LEGACY_KEY_PREFIX}*", count=batch_size):
+        keys.append(key.decode() if isinstance(key, bytes) else key)
+        if len(keys) >= batch_size:
+            flush()
+    if keys:
+        flush()
+    return stats
+
+
+def main():
+    parser = ArgumentParser(
+        description='Convert i:<cid> interests strings to bucketed bitmask hashes'
+    )
+    parser.add_argument('-H', '--host', default='localhost')
+    parser.add_argument('-p', '--port', type=int, default=6379)
+    parser.add_argument('--db', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--delete', action='store_true',
+                        help='Delete legacy keys after conversion')
+    args = parser.parse_args()
+
+    import redis
+
+    logging.basicConfig(
+        level=logging.INFO, format='[%(asctime)s] %(levelname).1s %(message)s'
+    )
+    client = redis.Redis(host=args.host, port=args.port, db=args.db)
+    stats = convert_legacy_interests(
+        client, batch_size=args.batch_size, delete=args.delete
+    )
+    logging.info(f"Converted {stats['converted']} clients, skipped {stats['skipped']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+import functools
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, map(_escape, labels))} "
+            f"{value}"
+            for labels, value in items
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def time(self, *labels):
+        return Timer(self, labels)
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = sorted(
+                (labels, ([*s[0]], s[1], s[2])) for labels, s in self._series.items()
+            )
+
+        lines = []
+        for labels, (counts, total, count) in items:
+            values = list(map(_escape, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(self.labelnames, values, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(
+                f"{self.name}_sum{_format_labels(self.labelnames, values)} {total}"
+            )
+            lines.append(
+                f"{self.name}_count{_format_labels(self.labelnames, values)} {count}"
+            )
+        return lines
+
+
+class Timer:
+    __slots__ = ("histogram", "labels", "ctx", "started")
+
+    def __init__(self, histogram, labels, ctx=None):
+        self.histogram = histogram
+        self.labels = labels
+        self.ctx = ctx
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        self.histogram.observe(elapsed, *self.labels)
+        if self.ctx is not None:
+            timings = self.ctx.setdefault("timings", {})
+            timings[self.labels[0]] = timings.get(self.labels[0], 0.0) + elapsed
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> bytes:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.collect())
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+REGISTRY = Registry()
+
+REQUESTS_TOTAL = REGISTRY.register(Counter(
+    "scoring_requests_total", "Processed API requests.", ("method", "code")))
+REQUESTS_SHED_TOTAL = REGISTRY.register(Counter(
+    "scoring_requests_shed_total",
+    "Requests rejected by admission control or dropped past their deadline.",
+    ("reason",)))
+REQUEST_STAGE_SECONDS = REGISTRY.register(Histogram(
+    "scoring_request_stage_seconds", "Time spent in each request processing stage.",
+    ("stage", "method")))
+STORE_OPERATION_SECONDS = REGISTRY.register(Histogram(
+    "scoring_store_operation_seconds", "Latency of Store operations.", ("operation",)))
+INVALID_CACHE_HITS_TOTAL = REGISTRY.register(Counter(
+    "scoring_invalid_cache_hits_total",
+    "Invalid requests answered from the negative cache.", ("method",)))
+STORE_CIRCUIT_STATE = REGISTRY.register(Gauge(
+    "scoring_store_circuit_state",
+    "Store circuit breaker state (0 - closed, 1 - half-open, 2 - open).", ("store",)))
+
+
+def stage(name, method="", ctx=None):
+    return Timer(REQUEST_STAGE_SECONDS, (name, method or ""), ctx)
+
+
+def timed_store_operation(operation):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                STORE_OPERATION_SECONDS.observe(
+                    time.perf_counter() - started, operation
+                )
+
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                STORE_OPERATION_SECONDS.observe(
+                    time.perf_counter() - started, operation
+                )
+
+        return async_wrapper if inspect.iscoroutinefunction(func) else wrapper
+    return decorator
@@ -1,6 +1,11 @@
+import re
 from typing import Type, Any, Union, List
 from datetime import date, datetime
 
+MISSING = object()
+DATE_RE = re.compile(r"(\d{1,2})\.(\d{1,2})\.(\d{4})")
+
+
 class Field(object):
     def __init__(
             self,
@@ -30,6 +35,31 @@ class Field(object):
     def _validate(self, value: Any) -> Any:
         return value
 
+    def __set_name__(self, owner, name):
+        self.field_name = name
+
+    def compile(self):
+        name = self.field_name
+        required = self.required
+        nullable = self.nullable
+        field_type = self.field_type
+        check = None if type(self)._validate is Field._validate else self._validate
+
+        def validate(value):
+            if value is MISSING:
+                if required:
+                    raise ValueError(f"{name} is required")
+                return None
+            if value is None:
+                if not nullable:
+                    raise ValueError(f"{name} cannot be None")
+                return None
+            if not isinstance(value, field_type):
+                raise ValueError(f"{name} must be {field_type}, not {type(value)}")
+            return check(value) if check else value
+
+        return validate
+
 
 class CharField(Field):
     def __init__(self, required: bool = False, nullable: bool = True):
@@ -57,10 +87,19 @@ class DateField(Field):
 
     def _validate(self, value: str) -> date:
         try:
-            parsed_date = datetime.strptime(value, '%d.%m.%Y').date()
+            match = DATE_RE.fullmatch(value)
+            if match:
+                day, month, year = match.groups()
+                return date(int(year), int(month), int(day))
+            return datetime.strptime(value, '%d.%m.%Y').date()
         except ValueError:
             raise ValueError(f"{self.field_name} must be in DD.MM.YYYY format")
 
+
+class BirthDayField(DateField):
+    def _validate(self, value: str) -> date:
+        parsed_date = super()._validate(value)
+
         today = date.today()
         age = today.year - parsed_date.year - (
                 (today.month, today.day) < (parsed_date.month, parsed_date.day)
@@ -71,10 +110,6 @@ class DateField(Field):
         return parsed_date
 
 
-class BirthDayField(DateField):
-    pass
-
-
 class GenderField(Field):
     def __init__(self, required: bool = False, nullable: bool = True):
         super().__init__(required=required, nullable=nullable, field_type=int)
@@ -102,6 +137,55 @@ class ClientIDsField(Field):
         return validated_ids
 
 
+class ArgumentsListField(Field):
+    def __init__(self, required: bool = True, nullable: bool = False):
+        super().__init__(required=required, nullable=nullable, field_type=list)
+
+    def _validate(self, value: list) -> List[dict]:
+        if not value:
+            raise ValueError(f"{self.field_name} cannot be empty")
+        if not all(isinstance(item, dict) for item in value):
+            raise ValueError(f"All items in {self.field_name} must be objects")
+        return value
+
+
 class ArgumentFileField(Field):
     def __init__(self, required: bool = False, nullable: bool = False):
         super().__init__(required=required, nullable=nullable, field_type=dict)
+
+
+class SchemaMeta(type):
+    def __new__(mcs, name, bases, namespace):
+        fields = {}
+        for base in reversed(bases):
+            fields.update(getattr(base, "_fields", {}))
+
+        own_fields = {
+            key: value for key, value in namespace.items() if isinstance(value, Field)
+        }
+        for key in own_fields:
+            del namespace[key]
+        fields.update(own_fields)
+        slots = tuple(namespace.get("__slots__", ()))
+        namespace["__slots__"] = tuple(own_fields) + slots
+
+        cls = super().__new__(mcs, name, bases, namespace)
+        for key, field in own_fields.items():
+            field.__set_name__(cls, key)
+        cls._fields = fields
+        cls._validators = tuple((key, field.compile()) for key, field in fields.items())
+        return cls
+
+
+class Schema(metaclass=SchemaMeta):
+    __slots__ = ()
+
+    def __init__(self, arguments):
+        set_attr = object.__setattr__
+        get = arguments.get
+        for name, validate in self._validators:
+            set_attr(self, name, validate(get(name, MISSING)))
+        self.validate()
+
+    def validate(self):
+        pass
@@ -1,28 +1,35 @@
+import asyncio
+import contextvars
 import random
 import logging
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Hashable, Set, Tuple
 
-def get_score(store, phone=None, email=None, birthday=None,
-              gender=None, first_name=None, last_name=None):
-    score = 0
-    cache_key_parts = [
-        phone or "",
-        email or "",
-        f"{birthday.strftime('%Y%m%d')}" if birthday else "",
-        str(gender) if gender is not None else "",
-        first_name or "",
-        last_name or ""
-    ]
-    cache_key = "uid:" + ":".join(cache_key_parts)
+from src import cache_keys
+from src.admission import DeadlineExceeded, check_deadline
+from src.cache_policy import score_policy
+from src.cache_keys import score_cache_key, legacy_score_cache_key
+from src.interests import DEFAULT_INTERESTS, LEGACY_KEY_PREFIX, encode_interests, \
+    decode_interests, group_fields, group_masks, masks_by_cid
+from src.singleflight import SingleFlight, AsyncSingleFlight
 
-    if store:
-        try:
-            cached_score = store.cache_get(cache_key)
-            if cached_score:
-                return float(cached_score)
-        except Exception as e:
-            logging.error(f"Cache get failed: {str(e)}")
+_score_flight = SingleFlight()
+_interests_flight = SingleFlight()
+_async_score_flight = AsyncSingleFlight()
+_async_interests_flight = AsyncSingleFlight()
+
+_refresher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="score-refresh")
+_refreshing: Set[Tuple[int, Hashable]] = set()
+_refreshing_lock = threading.Lock()
+_refresh_tasks: Set[asyncio.Task] = set()
 
 
+def compute_score(phone=None, email=None, birthday=None,
+                  gender=None, first_name=None, last_name=None):
+    score = 0
     if phone:
         score += 1.5
     if email:
@@ -31,35 +38,500 @@ def get_score(store, phone=None, email=None, birthday=None,
         score += 1.5
     if first_name and last_name:
         score += 0.5
+    return score
+
+
+SCORE_FIELDS = ("phone", "email", "birthday", "gender", "first_name", "last_name")
+_SCORE_TABLE = [compute_score(phone=i & 1, email=i & 2, birthday=i & 4, gender=i & 4,
+                              first_name=i & 8, last_name=i & 8) for i in range(16)]
+
+
+@lru_cache(maxsize=None)
+def _numpy_score_table(numpy):
+    return numpy.array(_SCORE_TABLE)
+
+
+def score_columns(items):
+    return {field: [fields.get(field) for fields in items] for field in SCORE_FIELDS}
+
+
+def compute_scores(phone, email, birthday, gender, first_name, last_name):
+    columns = (phone, email, birthday, gender, first_name, last_name)
+    # ndarray columns mean the caller has already imported numpy,
+    # so it is never imported here
+    numpy = sys.modules.get("numpy")
+    if numpy is not None and all(isinstance(c, numpy.ndarray) for c in columns):
+        masks = [column.astype(bool) for column in columns]
+        phone, email, birthday, gender, first_name, last_name = masks
+        index = (phone.astype(numpy.uint8)
+                 | email.astype(numpy.uint8) << 1
+                 | (birthday & gender).astype(numpy.uint8) << 2
+                 | (first_name & last_name).astype(numpy.uint8) << 3)
+        return _numpy_score_table(numpy)[index].tolist()
+
+    table = _SCORE_TABLE
+    rows = zip(phone, email, birthday, gender, first_name, last_name)
+    return [table[(1 if p else 0) | (2 if e else 0) | (4 if b and g else 0)
+                  | (8 if f and ln else 0)]
+            for p, e, b, g, f, ln in rows]
+
+
+def compute_scores_batch(items):
+    table = _SCORE_TABLE
+    return [table[(1 if f.get("phone") else 0)
+                  | (2 if f.get("email") else 0)
+                  | (4 if f.get("birthday") and f.get("gender") else 0)
+                  | (8 if f.get("first_name") and f.get("last_name") else 0)]
+            for f in items]
+
+
+def _claim_refresh(store, stale):
+    with _refreshing_lock:
+        claimed = {key: fields for key, fields in stale.items()
+                   if (id(store), key) not in _refreshing}
+        _refreshing.update((id(store), key) for key in claimed)
+    return claimed
+
+
+def _release_refresh(store, keys):
+    with _refreshing_lock:
+        _refreshing.difference_update((id(store), key) for key in keys)
+
+
+def _refresh_scores(store, stale):
+    try:
+        scores = dict(zip(stale, compute_scores_batch(list(stale.values()))))
+        store.cache_set_many(*score_policy.entries(scores), l1=score_policy.l1)
+    except Exception as e:
+        logging.error(f"Cache refresh failed: {str(e)}")
+    finally:
+        _release_refresh(store, stale)
+
+
+async def _refresh_scores_async(store, stale):
+    try:
+        scores = dict(zip(stale, compute_scores_batch(list(stale.values()))))
+        await store.cache_set_many(*score_policy.entries(scores), l1=score_policy.l1)
+    except Exception as e:
+        logging.error(f"Cache refresh failed: {str(e)}")
+    finally:
+        _release_refresh(store, stale)
+
+
+def _schedule_refresh(store, stale):
+    stale = _claim_refresh(store, stale)
+    if stale:
+        _refresher.submit(_refresh_scores, store, stale)
+
+
+def _schedule_refresh_async(store, stale):
+    stale = _claim_refresh(store, stale)
+    if stale:
+        # a fresh context keeps the request deadline from cancelling the refresh
+        refresh = _refresh_scores_async(store, stale)
+        task = asyncio.get_running_loop().create_task(refresh,
+                                                      context=contextvars.Context())
+        _refresh_tasks.add(task)
+        task.add_done_callback(_refresh_tasks.discard)
 
-    if store:
-        try:
-            store.cache_set(cache_key, score, 60 * 60)  # cache for 1 hour
-        except Exception as e:
-            logging.error(f"Cache set failed: {str(e)}")
+
+def _cache_score(store, cache_key, score):
+    entry = score_policy.entry(score)
+    if entry:
+        store.cache_set(cache_key, *entry, l1=score_policy.l1)
+
+
+async def _cache_score_async(store, cache_key, score):
+    entry = score_policy.entry(score)
+    if entry:
+        await store.cache_set(cache_key, *entry, l1=score_policy.l1)
+
+
+def _load_score(store, cache_key, fields):
+    try:
+        cached_score = store.cache_get(cache_key, l1=score_policy.l1)
+        if not cached_score and cache_keys.legacy_reads:
+            cached_score = store.cache_get(legacy_score_cache_key(**fields), l1=False)
+            if cached_score:
+                _cache_score(store, cache_key, float(cached_score))
+        if cached_score:
+            score, stale = score_policy.decode(cached_score)
+            if stale:
+                _schedule_refresh(store, {cache_key: fields})
+            return float(score)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logging.error(f"Cache get failed: {str(e)}")
+
+    score = compute_score(**fields)
+
+    try:
+        _cache_score(store, cache_key, score)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logging.error(f"Cache set failed: {str(e)}")
 
     return score
 
+
+async def _load_score_async(store, cache_key, fields):
+    try:
+        cached_score = await store.cache_get(cache_key, l1=score_policy.l1)
+        if not cached_score and cache_keys.legacy_reads:
+            legacy_key = legacy_score_cache_key(**fields)
+            cached_score = await store.cache_get(legacy_key, l1=False)
+            if cached_score:
+                await _cache_score_async(store, cache_key, float(cached_score))
+        if cached_score:
+            score, stale = score_policy.decode(cached_score)
+            if stale:
+                _schedule_refresh_async(store, {cache_key: fields})
+            return float(score)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logging.error(f"Cache get failed: {str(e)}")
+
+    score = compute_score(**fields)
+
+    try:
+        await _cache_score_async(store, cache_key, score)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logging.error(f"Cache set failed: {str(e)}")
+
+    return score
+
+
+def _shared(flight, load):
+    expired = []
+
+    def lead(*args):
+        try:
+            return load(*args)
+        except DeadlineExceeded:
+            expired.append(True)
+            raise
+
+    try:
+        return flight(lead)
+    except DeadlineExceeded:
+        if expired:
+            raise
+        # a follower got the error of another request's flight:
+        # retry once under its own deadline
+        check_deadline()
+        return flight(load)
+
+
+async def _shared_async(flight, load):
+    expired = []
+
+    async def lead(*args):
+        try:
+            return await load(*args)
+        except DeadlineExceeded:
+            expired.append(True)
+            raise
+
+    try:
+        return await flight(lead)
+    except DeadlineExceeded:
+        if expired:
+            raise
+        check_deadline()
+        return await flight(load)
+
+
+def get_score(store, phone=None, email=None, birthday=None,
+              gender=None, first_name=None, last_name=None):
+    fields = dict(phone=phone, email=email, birthday=birthday,
+                  gender=gender, first_name=first_name, last_name=last_name)
+    if not store or not score_policy.enabled:
+        return compute_score(**fields)
+
+    cache_key = score_cache_key(**fields, key_namespace=score_policy.namespace)
+    return _shared(lambda load: _score_flight.do((id(store), cache_key), load),
+                   lambda: _load_score(store, cache_key, fields))
+
+
+async def get_score_async(store, phone=None, email=None, birthday=None,
+                          gender=None, first_name=None, last_name=None):
+    fields = dict(phone=phone, email=email, birthday=birthday,
+                  gender=gender, first_name=first_name, last_name=last_name)
+    if not store or not score_policy.enabled:
+        return compute_score(**fields)
+
+    cache_key = score_cache_key(**fields, key_namespace=score_policy.namespace)
+    return await _shared_async(
+        lambda load: _async_score_flight.do((id(store), cache_key), load),
+        lambda: _load_score_async(store, cache_key, fields),
+    )
+
+
 def get_interests(store, cid):
     if not store:
         raise ValueError("Store is required for get_interests")
 
+    return _shared(lambda load: _interests_flight.do((id(store), cid), load),
+                   lambda: _load_interests_batch(store, [cid])[cid])
+
+
+def _fill_scores(items, keys, cached):
+    scores = [None] * len(cached)
+    stale = {}
+    for i, value in enumerate(cached):
+        if value:
+            score, expired = score_policy.decode(value)
+            scores[i] = float(score)
+            if expired:
+                stale[keys[i]] = items[i]
+    misses = [i for i, score in enumerate(scores) if score is None]
+    missing = {}
+    for i, score in zip(misses, compute_scores_batch([items[i] for i in misses])):
+        scores[i] = score
+        missing[keys[i]] = score
+    return scores, missing, stale
+
+
+def _legacy_misses(items, cached):
+    return {
+        i: legacy_score_cache_key(**items[i])
+        for i, value in enumerate(cached)
+        if not value
+    }
+
+
+def _merge_legacy(keys, cached, misses, values):
+    cached = list(cached)
+    migrated = {}
+    for i, value in zip(misses, values):
+        if value:
+            cached[i] = value
+            migrated[keys[i]] = float(value)
+    return cached, migrated
+
+
+def _load_scores(store, keys, items):
+    cached = [None] * len(keys)
+    migrated = {}
+    try:
+        cached = store.cache_get_many(keys, l1=score_policy.l1)
+        misses = _legacy_misses(items, cached) if cache_keys.legacy_reads else None
+        if misses:
+            values = store.cache_get_many(list(misses.values()), l1=False)
+            cached, migrated = _merge_legacy(keys, cached, misses, values)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logging.error(f"Cache get failed: {str(e)}")
+
+    scores, missing, stale = _fill_scores(items, keys, cached)
+    missing.update(migrated)
+
+    if missing:
+        try:
+            store.cache_set_many(*score_policy.entries(missing), l1=score_policy.l1)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logging.error(f"Cache set failed: {str(e)}")
+    if stale:
+        _schedule_refresh(store, stale)
+
+    return scores
+
+
+async def _load_scores_async(store, keys, items):
+    cached = [None] * len(keys)
+    migrated = {}
     try:
-        interests = store.get(f"i:{cid}")
-        if interests:
-            return interests.decode().split(",")
+        cached = await store.cache_get_many(keys, l1=score_policy.l1)
+        misses = _legacy_misses(items, cached) if cache_keys.legacy_reads else None
+        if misses:
+            values = await store.cache_get_many(list(misses.values()), l1=False)
+            cached, migrated = _merge_legacy(keys, cached, misses, values)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logging.error(f"Cache get failed: {str(e)}")
+
+    scores, missing, stale = _fill_scores(items, keys, cached)
+    missing.update(migrated)
+
+    if missing:
+        try:
+            entries = score_policy.entries(missing)
+            await store.cache_set_many(*entries, l1=score_policy.l1)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logging.error(f"Cache set failed: {str(e)}")
+    if stale:
+        _schedule_refresh_async(store, stale)
+
+    return scores
+
+
+def get_scores_batch(store, items):
+    if not store or not score_policy.enabled:
+        return compute_scores_batch(items)
+
+    namespace = score_policy.namespace
+    keys = [score_cache_key(**fields, key_namespace=namespace) for fields in items]
+    fields_by_key = dict(zip(keys, items))
+
+    def load(owned):
+        owned_keys = [key for _, key in owned]
+        scores = _load_scores(
+            store, owned_keys, [fields_by_key[key] for key in owned_keys]
+        )
+        return dict(zip(owned, scores))
+
+    scores = _shared(
+        lambda lead: _score_flight.do_many([(id(store), key) for key in keys], lead),
+        load,
+    )
+    return [scores[(id(store), key)] for key in keys]
+
+
+async def get_scores_batch_async(store, items):
+    if not store or not score_policy.enabled:
+        return compute_scores_batch(items)
+
+    namespace = score_policy.namespace
+    keys = [score_cache_key(**fields, key_namespace=namespace) for fields in items]
+    fields_by_key = dict(zip(keys, items))
+
+    async def load(owned):
+        owned_keys = [key for _, key in owned]
+        scores = await _load_scores_async(
+            store, owned_keys, [fields_by_key[key] for key in owned_keys]
+        )
+        return dict(zip(owned, scores))
+
+    scores = await _shared_async(
+        lambda lead: _async_score_flight.do_many(
+            [(id(store), key) for key in keys], lead
+        ),
+        load,
+    )
+    return [scores[(id(store), key)] for key in keys]
+
+
+def _fill_interests(cids, masks, legacy):
+    result = {}
+    missing = {}
+    for cid, mask, value in zip(cids, masks, legacy):
+        if mask is not None:
+            result[cid] = decode_interests(mask)
+            continue
+        if value:
+            interests = value.decode().split(",")
+            try:
+                missing[cid] = encode_interests(interests)
+            except ValueError:
+                result[cid] = interests
+                continue
+        else:
+            missing[cid] = encode_interests(random.sample(DEFAULT_INTERESTS, 2))
+        result[cid] = decode_interests(missing[cid])
+    return result, missing
+
+
+def _legacy_interests_keys(cids, masks):
+    return [
+        f"{LEGACY_KEY_PREFIX}{cid}" for cid, mask in zip(cids, masks) if mask is None
+    ]
+
+
+def _align_legacy(masks, values):
+    values = iter(values)
+    return [next(values) if mask is None else None for mask in masks]
+
+
+def _load_interests_batch(store, cids):
+    fields = group_fields(cids)
+    try:
+        masks = masks_by_cid(cids, fields, store.hget_many(fields))
+        legacy_keys = _legacy_interests_keys(cids, masks)
+        found = store.get_many(legacy_keys) if legacy_keys else []
+        legacy = _align_legacy(masks, found)
     except Exception as e:
         logging.error(f"Failed to get interests from store: {str(e)}")
         raise
 
-    default_interests = ["cars", "pets", "travel", "hi-tech",
-                         "sport", "music", "books", "tv",
-                         "cinema", "geek", "otus"]
-    interests = random.sample(default_interests, 2)
+    result, missing = _fill_interests(cids, masks, legacy)
+
+    if missing:
+        try:
+            store.hset_many(group_masks(missing))
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logging.error(f"Failed to save interests to store: {str(e)}")
+
+    return result
 
+
+async def _load_interests_batch_async(store, cids):
+    fields = group_fields(cids)
     try:
-        store.set(f"i:{cid}", ",".join(interests))
+        masks = masks_by_cid(cids, fields, await store.hget_many(fields))
+        legacy_keys = _legacy_interests_keys(cids, masks)
+        found = await store.get_many(legacy_keys) if legacy_keys else []
+        legacy = _align_legacy(masks, found)
     except Exception as e:
-        logging.error(f"Failed to save interests to store: {str(e)}")
+        logging.error(f"Failed to get interests from store: {str(e)}")
+        raise
+
+    result, missing = _fill_interests(cids, masks, legacy)
+
+    if missing:
+        try:
+            await store.hset_many(group_masks(missing))
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logging.error(f"Failed to save interests to store: {str(e)}")
+
+    return result
+
+
+def get_interests_batch(store, cids):
+    if not store:
+        raise ValueError("Store is required for get_interests")
+
+    def load(owned):
+        interests = _load_interests_batch(store, [cid for _, cid in owned])
+        return {(id(store), cid): value for cid, value in interests.items()}
+
+    cids = list(dict.fromkeys(cids))
+    interests = _shared(
+        lambda lead: _interests_flight.do_many(
+            [(id(store), cid) for cid in cids], lead
+        ),
+        load,
+    )
+    return {cid: interests[(id(store), cid)] for cid in cids}
+
+
+async def get_interests_batch_async(store, cids):
+    if not store:
+        raise ValueError("Store is required for get_interests")
+
+    async def load(owned):
+        interests = await _load_interests_batch_async(store, [cid for _, cid in owned])
+        return {(id(store), cid): value for cid, value in interests.items()}
 
-    return interests
\ No newline at end of file
+    cids = list(dict.fromkeys(cids))
+    interests = await _shared_async(
+        lambda lead: _async_interests_flight.do_many(
+            [(id(store), cid) for cid in cids], lead
+        ),
+        load,
+    )
+    return {cid: interests[(id(store), cid)] for cid in cids}
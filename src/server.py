@@ -0,0 +1,138 @@
+import logging
+import os
+import select
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer
+
+from src.admission import InFlightLimiter
+from src.metrics import REQUESTS_SHED_TOTAL
+
+
+class SerialHTTPServer(HTTPServer):
+    def busy(self):
+        return bool(select.select([self.socket], [], [], 0)[0])
+
+
+class ThreadPoolHTTPServer(HTTPServer):
+    def __init__(self, server_address, handler_class, threads=8, max_in_flight=0,
+                 bind_and_activate=True):
+        super().__init__(server_address, handler_class, bind_and_activate)
+        self.threads = threads
+        self.limiter = InFlightLimiter(max_in_flight)
+        self._pool = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix="http-worker"
+        )
+        self._queued = 0
+        self._slots = set()
+        self._lock = threading.Lock()
+
+    def busy(self):
+        return self._queued > 0
+
+    def acquire_slot(self, request):
+        # a slot is held while a connection waits for a worker
+        # or has a request in progress, not while it idles
+        if not self.limiter.try_acquire():
+            return False
+        with self._lock:
+            self._slots.add(request)
+        return True
+
+    def release_slot(self, request):
+        with self._lock:
+            if request not in self._slots:
+                return
+            self._slots.remove(request)
+        self.limiter.release()
+
+    def process_request(self, request, client_address):
+        if not self.acquire_slot(request):
+            self.reject_request(request)
+            return
+        with self._lock:
+            self._queued += 1
+        self._pool.submit(self._process_request_worker, request, client_address)
+
+    def reject_request(self, request):
+        REQUESTS_SHED_TOTAL.inc("overload")
+        try:
+            request.sendall(self.RequestHandlerClass.overloaded_response())
+            request.setblocking(False)
+            request.recv(65536)
+        except OSError:
+            pass
+        finally:
+            self.shutdown_request(request)
+
+    def _process_request_worker(self, request, client_address):
+        with self._lock:
+            self._queued -= 1
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.release_slot(request)
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=True)
+
+
+def make_server(host, port, handler_class, threads=0, max_in_flight=0):
+    if threads > 0:
+        return ThreadPoolHTTPServer(
+            (host, port), handler_class, threads=threads, max_in_flight=max_in_flight
+        )
+    return SerialHTTPServer((host, port), handler_class)
+
+
+def serve(server, store_factory, warmup=None):
+    store = server.RequestHandlerClass.store = store_factory()
+    if warmup is not None:
+        warmup(store)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info('Server stopped')
+    finally:
+        server.server_close()
+
+
+def serve_prefork(server, workers, store_factory, warmup=None):
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            exit_code = 0
+            try:
+                logging.info(f'Worker {os.getpid()} started')
+                serve(server, store_factory, warmup)
+            except Exception:
+                logging.exception(f'Worker {os.getpid()} failed')
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        children.append(pid)
+
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        logging.info('Stopping workers')
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in children:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+    finally:
+        server.server_close()
@@ -0,0 +1,158 @@
+import asyncio
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterable
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if call is None:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def do_many(
+        self, keys: Iterable[Hashable], fn: Callable[[list], Dict[Hashable, Any]]
+    ) -> Dict[Hashable, Any]:
+        owned, calls = [], {}
+        with self._lock:
+            for key in keys:
+                call = self._calls.get(key)
+                if call is None:
+                    call = self._calls[key] = _Call()
+                    owned.append(key)
+                calls[key] = call
+
+        if owned:
+            try:
+                produced = fn(owned)
+                for key in owned:
+                    calls[key].result = produced[key]
+            except BaseException as e:
+                for key in owned:
+                    calls[key].error = e
+                raise
+            finally:
+                with self._lock:
+                    for key in owned:
+                        del self._calls[key]
+                for key in owned:
+                    calls[key].event.set()
+
+        results = {}
+        for key, call in calls.items():
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            results[key] = call.result
+        return results
+
+
+def _fail(future: asyncio.Future, error: BaseException) -> None:
+    if isinstance(error, asyncio.CancelledError):
+        future.cancel()
+    else:
+        future.set_exception(error)
+        future.exception()
+
+
+def _leader_cancelled(future: asyncio.Future) -> bool:
+    # the shared future is cancelled with its leader;
+    # a follower that was not cancelled itself takes over
+    task = asyncio.current_task()
+    return future.cancelled() and not (task is not None and task.cancelling())
+
+
+class AsyncSingleFlight:
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        future = self._calls.get(key)
+        if future is not None:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not _leader_cancelled(future):
+                    raise
+            return await self.do(key, fn)
+
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+        except BaseException as e:
+            _fail(future, e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    async def do_many(
+        self, keys: Iterable[Hashable], fn: Callable[[list], Any]
+    ) -> Dict[Hashable, Any]:
+        owned, futures = [], {}
+        loop = asyncio.get_running_loop()
+        for key in keys:
+            future = self._calls.get(key)
+            if future is None:
+                future = self._calls[key] = loop.create_future()
+                owned.append(key)
+            futures[key] = future
+
+        if owned:
+            try:
+                produced = await fn(owned)
+                for key in owned:
+                    futures[key].set_result(produced[key])
+            except BaseException as e:
+                for key in owned:
+                    if not futures[key].done():
+                        _fail(futures[key], e)
+                raise
+            finally:
+                for key in owned:
+                    del self._calls[key]
+
+        results, orphaned = {}, []
+        for key, future in futures.items():
+            try:
+                results[key] = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not _leader_cancelled(future):
+                    raise
+                orphaned.append(key)
+        if orphaned:
+            results.update(await self.do_many(orphaned, fn))
+        return results
@@ -0,0 +1,366 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from bisect import bisect
+from typing import Any, Dict, List, Optional, Protocol, Sequence, Tuple, Union, \
+    runtime_checkable
+
+# a batch write takes one TTL for every key or a TTL per key
+Expire = Union[int, Dict[str, int]]
+
+
+def encode_value(value: Any) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode()
+
+
+def key_expire(expire: Optional[Expire], key: str) -> Optional[int]:
+    return expire.get(key) if isinstance(expire, dict) else expire
+
+
+def cache_expire(expire: Expire) -> Expire:
+    if isinstance(expire, dict):
+        return {f"cache:{key}": ttl for key, ttl in expire.items()}
+    return expire
+
+
+@runtime_checkable
+class StoreProtocol(Protocol):
+    name: str
+
+    def ping(self) -> bool: ...
+
+    def get(self, key: str) -> Optional[Any]: ...
+
+    def set(self, key: str, value: Any) -> bool: ...
+
+    def cache_get(self, key: str, l1: bool = True) -> Optional[Any]: ...
+
+    def cache_set(self, key: str, value: Any, expire: int = 60,
+                  l1: bool = True) -> bool: ...
+
+    def get_many(self, keys: List[str]) -> List[Optional[Any]]: ...
+
+    def set_many(self, mapping: Dict[str, Any],
+                 expire: Optional[Expire] = None) -> bool: ...
+
+    def cache_get_many(self, keys: List[str],
+                       l1: bool = True) -> List[Optional[Any]]: ...
+
+    def cache_set_many(self, mapping: Dict[str, Any], expire: Expire = 60,
+                       l1: bool = True) -> bool: ...
+
+    def hget_many(self, fields: Dict[str, List[str]]) -> Dict[str, List[Optional[Any]]]:
+        ...
+
+    def hset_many(self, mapping: Dict[str, Dict[str, Any]]) -> bool: ...
+
+
+class _Shard:
+    __slots__ = ("lock", "data", "hashes")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data: Dict[str, tuple] = {}
+        self.hashes: Dict[str, Dict[str, bytes]] = {}
+
+
+class MemoryStore:
+    def __init__(self, shards: int = 16, name: str = "memory"):
+        self.name = name
+        self._shards = [_Shard() for _ in range(shards)]
+
+    def _roundtrip(self):
+        pass
+
+    def _shard(self, key: str) -> _Shard:
+        return self._shards[hash(key) % len(self._shards)]
+
+    def _group(self, keys) -> Dict[int, List[int]]:
+        groups: Dict[int, List[int]] = {}
+        for i, key in enumerate(keys):
+            groups.setdefault(hash(key) % len(self._shards), []).append(i)
+        return groups
+
+    @staticmethod
+    def _read(shard: _Shard, key: str) -> Optional[bytes]:
+        item = shard.data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del shard.data[key]
+            return None
+        return value
+
+    @staticmethod
+    def _write(shard: _Shard, key: str, value: Any, expire: Optional[float] = None):
+        expires_at = time.monotonic() + expire if expire else None
+        shard.data[key] = (encode_value(value), expires_at)
+
+    def ping(self) -> bool:
+        return True
+
+    def get(self, key: str) -> Optional[Any]:
+        self._roundtrip()
+        shard = self._shard(key)
+        with shard.lock:
+            return self._read(shard, key)
+
+    def set(self, key: str, value: Any) -> bool:
+        self._roundtrip()
+        shard = self._shard(key)
+        with shard.lock:
+            self._write(shard, key, value)
+        return True
+
+    def cache_get(self, key: str, l1: bool = True) -> Optional[Any]:
+        return self.get(f"cache:{key}")
+
+    def cache_set(self, key: str, value: Any, expire: int = 60,
+                  l1: bool = True) -> bool:
+        self._roundtrip()
+        key = f"cache:{key}"
+        shard = self._shard(key)
+        with shard.lock:
+            self._write(shard, key, value, expire)
+        return True
+
+    def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        self._roundtrip()
+        values: List[Optional[Any]] = [None] * len(keys)
+        for index, positions in self._group(keys).items():
+            shard = self._shards[index]
+            with shard.lock:
+                for i in positions:
+                    values[i] = self._read(shard, keys[i])
+        return values
+
+    def set_many(self, mapping: Dict[str, Any],
+                 expire: Optional[Expire] = None) -> bool:
+        self._roundtrip()
+        keys = list(mapping)
+        for index, positions in self._group(keys).items():
+            shard = self._shards[index]
+            with shard.lock:
+                for i in positions:
+                    key = keys[i]
+                    self._write(shard, key, mapping[key], key_expire(expire, key))
+        return True
+
+    def cache_get_many(self, keys: List[str], l1: bool = True) -> List[Optional[Any]]:
+        return self.get_many([f"cache:{key}" for key in keys])
+
+    def cache_set_many(self, mapping: Dict[str, Any], expire: Expire = 60,
+                       l1: bool = True) -> bool:
+        prefixed = {f"cache:{key}": value for key, value in mapping.items()}
+        return self.set_many(prefixed, cache_expire(expire))
+
+    def hget_many(self, fields: Dict[str, List[str]]) -> Dict[str, List[Optional[Any]]]:
+        self._roundtrip()
+        result = {}
+        for key, names in fields.items():
+            shard = self._shard(key)
+            with shard.lock:
+                values = shard.hashes.get(key, {})
+                result[key] = [values.get(name) for name in names]
+        return result
+
+    def hset_many(self, mapping: Dict[str, Dict[str, Any]]) -> bool:
+        self._roundtrip()
+        for key, values in mapping.items():
+            shard = self._shard(key)
+            with shard.lock:
+                encoded = {name: encode_value(v) for name, v in values.items()}
+                shard.hashes.setdefault(key, {}).update(encoded)
+        return True
+
+
+def default_redis_nodes() -> str:
+    nodes = os.environ.get("SCORING_REDIS_NODES")
+    if nodes:
+        return nodes
+    host = os.environ.get('REDIS_HOST', 'localhost')
+    port = os.environ.get('REDIS_PORT', '6379')
+    return f"{host}:{port}/{os.environ.get('REDIS_DB', '0')}"
+
+
+def parse_node(spec: str) -> Tuple[str, int, int]:
+    address, _, db = spec.partition("/")
+    host, _, port = address.rpartition(":")
+    if not host:
+        host, port = address, ""
+    return host or "localhost", int(port or 6379), int(db or 0)
+
+
+def _ring_hash(value: str) -> int:
+    digest = hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class HashRing:
+    def __init__(self, names: Sequence[str], replicas: int = 160):
+        if not names:
+            raise ValueError("HashRing needs at least one node")
+        points = sorted((_ring_hash(f"{name}#{i}"), name)
+                        for name in names for i in range(replicas))
+        self._hashes = [h for h, _ in points]
+        self._names = [name for _, name in points]
+
+    def node_for(self, key: str) -> str:
+        return self._names[bisect(self._hashes, _ring_hash(key)) % len(self._hashes)]
+
+
+class _ShardedBase:
+    def __init__(self, nodes: Sequence[Any], replicas: int = 160):
+        self.nodes = {node.name: node for node in nodes}
+        if len(self.nodes) != len(nodes):
+            raise ValueError("Sharded store nodes must have unique names")
+        self.name = ",".join(self.nodes)
+        self.ring = HashRing(list(self.nodes), replicas)
+
+    def node_for(self, key: str):
+        return self.nodes[self.ring.node_for(key)]
+
+    def _group(self, keys) -> Dict[str, List[int]]:
+        groups: Dict[str, List[int]] = {}
+        for i, key in enumerate(keys):
+            groups.setdefault(self.ring.node_for(key), []).append(i)
+        return groups
+
+    def _group_mapping(self, mapping: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        groups: Dict[str, Dict[str, Any]] = {}
+        for key, value in mapping.items():
+            groups.setdefault(self.ring.node_for(key), {})[key] = value
+        return groups
+
+    def pool_stats(self) -> Dict[str, Dict[str, int]]:
+        return {name: node.pool_stats() for name, node in self.nodes.items()
+                if hasattr(node, "pool_stats")}
+
+
+class ShardedStore(_ShardedBase):
+    def _get_many(self, method: str, keys: List[str], *args) -> List[Optional[Any]]:
+        values: List[Optional[Any]] = [None] * len(keys)
+        for name, positions in self._group(keys).items():
+            part = [keys[i] for i in positions]
+            fetched = getattr(self.nodes[name], method)(part, *args)
+            for i, value in zip(positions, fetched):
+                values[i] = value
+        return values
+
+    def _set_many(self, method: str, mapping: Dict[str, Any], *args) -> bool:
+        results = [getattr(self.nodes[name], method)(part, *args)
+                   for name, part in self._group_mapping(mapping).items()]
+        return all(results)
+
+    def ping(self) -> bool:
+        return all(node.ping() for node in self.nodes.values())
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.node_for(key).get(key)
+
+    def set(self, key: str, value: Any) -> bool:
+        return self.node_for(key).set(key, value)
+
+    def cache_get(self, key: str, l1: bool = True) -> Optional[Any]:
+        return self.node_for(key).cache_get(key, l1)
+
+    def cache_set(self, key: str, value: Any, expire: int = 60,
+                  l1: bool = True) -> bool:
+        return self.node_for(key).cache_set(key, value, expire, l1)
+
+    def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        return self._get_many("get_many", keys)
+
+    def set_many(self, mapping: Dict[str, Any],
+                 expire: Optional[Expire] = None) -> bool:
+        return self._set_many("set_many", mapping, expire)
+
+    def cache_get_many(self, keys: List[str], l1: bool = True) -> List[Optional[Any]]:
+        return self._get_many("cache_get_many", keys, l1)
+
+    def cache_set_many(self, mapping: Dict[str, Any], expire: Expire = 60,
+                       l1: bool = True) -> bool:
+        return self._set_many("cache_set_many", mapping, expire, l1)
+
+    def hget_many(self, fields: Dict[str, List[str]]) -> Dict[str, List[Optional[Any]]]:
+        result = {}
+        for name, part in self._group_mapping(fields).items():
+            result.update(self.nodes[name].hget_many(part))
+        return result
+
+    def hset_many(self, mapping: Dict[str, Dict[str, Any]]) -> bool:
+        return self._set_many("hset_many", mapping)
+
+
+class AsyncShardedStore(_ShardedBase):
+    async def _get_many(self, method: str, keys: List[str],
+                        *args) -> List[Optional[Any]]:
+        groups = self._group(keys)
+        fetched = await asyncio.gather(*(
+            getattr(self.nodes[name], method)([keys[i] for i in positions], *args)
+            for name, positions in groups.items()))
+        values: List[Optional[Any]] = [None] * len(keys)
+        for positions, part in zip(groups.values(), fetched):
+            for i, value in zip(positions, part):
+                values[i] = value
+        return values
+
+    async def _set_many(self, method: str, mapping: Dict[str, Any], *args) -> bool:
+        results = await asyncio.gather(*(
+            getattr(self.nodes[name], method)(part, *args)
+            for name, part in self._group_mapping(mapping).items()))
+        return all(results)
+
+    async def close(self):
+        for node in self.nodes.values():
+            await node.close()
+
+    async def ping(self) -> bool:
+        return all(await asyncio.gather(*(node.ping() for node in self.nodes.values())))
+
+    async def get(self, key: str) -> Optional[Any]:
+        return await self.node_for(key).get(key)
+
+    async def set(self, key: str, value: Any) -> bool:
+        return await self.node_for(key).set(key, value)
+
+    async def cache_get(self, key: str, l1: bool = True) -> Optional[Any]:
+        return await self.node_for(key).cache_get(key, l1)
+
+    async def cache_set(self, key: str, value: Any, expire: int = 60,
+                        l1: bool = True) -> bool:
+        return await self.node_for(key).cache_set(key, value, expire, l1)
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        return await self._get_many("get_many", keys)
+
+    async def set_many(self, mapping: Dict[str, Any],
+                       expire: Optional[Expire] = None) -> bool:
+        return await self._set_many("set_many", mapping, expire)
+
+    async def cache_get_many(self, keys: List[str],
+                             l1: bool = True) -> List[Optional[Any]]:
+        return await self._get_many("cache_get_many", keys, l1)
+
+    async def cache_set_many(self, mapping: Dict[str, Any], expire: Expire = 60,
+                             l1: bool = True) -> bool:
+        return await self._set_many("cache_set_many", mapping, expire, l1)
+
+    async def hget_many(
+        self, fields: Dict[str, List[str]]
+    ) -> Dict[str, List[Optional[Any]]]:
+        result = {}
+        groups = self._group_mapping(fields)
+        parts = await asyncio.gather(*(self.nodes[name].hget_many(part)
+                                       for name, part in groups.items()))
+        for part in parts:
+            result.update(part)
+        return result
+
+    async def hset_many(self, mapping: Dict[str, Dict[str, Any]]) -> bool:
+        return await self._set_many("hset_many", mapping)
@@ -1,8 +1,10 @@
 import pytest
 import redis
 from src.store import Store
-from src.scoring_service import get_score, get_interests
-
+from src.cache_keys import score_cache_key
+from src.interests import convert_legacy_interests, decode_interests, interests_location
+from src.scoring_service import get_score, get_interests, get_interests_batch, \
+    get_scores_batch
 
 
 @pytest.fixture
@@ -19,26 +21,62 @@ def test_score_caching(redis_store):
 
     assert score1 == score2
 
+
+def test_scores_batch_caching(redis_store):
+    items = [
+        {"phone": "79175002040", "email": "test@example.com"},
+        {"first_name": "a", "last_name": "b"},
+    ]
+    assert get_scores_batch(redis_store, items) == [3.0, 0.5]
+
+    keys = [f"cache:{score_cache_key(**item)}" for item in items]
+    assert [float(v) for v in redis_store.get_many(keys)] == [3.0, 0.5]
+    assert get_scores_batch(redis_store, items) == [3.0, 0.5]
+
+
 def test_interests_storage(redis_store):
     cid = 123
     interests = get_interests(redis_store, cid)
 
-    stored = redis_store.get(f"i:{cid}")
+    key, field = interests_location(cid)
+    stored = redis_store._client.hget(key, field)
     assert stored is not None
-    assert set(stored.decode().split(",")) == set(interests)
+    assert decode_interests(stored) == interests
+
+
+def test_interests_batch_storage(redis_store):
+    redis_store.set("i:1", "cars,pets")
+    interests = get_interests_batch(redis_store, [1, 2, 3])
+
+    assert interests[1] == ["cars", "pets"]
+    stored = redis_store.hget_many({"ib:0": ["1", "2", "3"]})["ib:0"]
+    assert [decode_interests(v) for v in stored] == [interests[c] for c in (1, 2, 3)]
+
+
+def test_convert_legacy_interests(redis_store):
+    redis_store.set_many({"i:5": "pets,cars", "i:150": "otus", "i:7": "unknown"})
+    stats = convert_legacy_interests(redis_store._client, delete=True)
+
+    assert stats == {"converted": 2, "skipped": 1}
+    expected = {5: ["cars", "pets"], 150: ["otus"]}
+    assert get_interests_batch(redis_store, [5, 150]) == expected
+    assert redis_store.get_many(["i:5", "i:150", "i:7"])[:2] == [None, None]
+
 
 def test_score_without_store():
     score = get_score(None, phone="79175002040", email="test@example.com")
     assert score == 3.0
 
+
 def test_interests_without_store():
     with pytest.raises(ValueError):
         get_interests(None, 123)
 
+
 def test_store_reconnection(redis_store, mocker):
     mocker.patch.object(redis_store._client, 'get', side_effect=redis.ConnectionError())
 
     assert redis_store.cache_get("test") is None
 
     with pytest.raises(redis.ConnectionError):
-        redis_store.get("test")
\ No newline at end of file
+        redis_store.get("test")
@@ -107,6 +107,44 @@ class TestSuite(unittest.TestCase):
         score = response.get("score")
         self.assertEqual(score, 42)
 
+    def test_ok_score_batch_request(self):
+        items = [
+            {"phone": "79175002040", "email": "stupnikov@otus.ru"},
+            {"phone": "89175002040", "email": "stupnikov@otus.ru"},
+            {"first_name": "a", "last_name": "b"},
+        ]
+        request = {
+            "account": "horns&hoofs",
+            "login": "h&f",
+            "method": "online_score_batch",
+            "arguments": {"items": items},
+        }
+        self.set_valid_auth(request)
+        response, code = self.get_response(request)
+        self.assertEqual(OK, code)
+        scores = response["scores"]
+        self.assertEqual(3.0, scores[0]["score"])
+        self.assertIn("error", scores[1])
+        self.assertEqual(0.5, scores[2]["score"])
+        self.assertEqual(1, self.context.get("nerrors"))
+
+    @cases([
+        {},
+        {"items": []},
+        {"items": [1, 2]},
+    ])
+    def test_invalid_score_batch_request(self, arguments):
+        request = {
+            "account": "horns&hoofs",
+            "login": "h&f",
+            "method": "online_score_batch",
+            "arguments": arguments,
+        }
+        self.set_valid_auth(request)
+        response, code = self.get_response(request)
+        self.assertEqual(INVALID_REQUEST, code, arguments)
+        self.assertIn("error", response)
+
     @cases([
         {},
         {"date": "20.07.2017"},
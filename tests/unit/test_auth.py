@@ -0,0 +1,53 @@
+import datetime
+import hashlib
+import unittest
+from unittest import mock
+
+from src.api_requests import ADMIN_LOGIN, ADMIN_SALT, SALT, Authenticator
+
+
+class TestAuthenticator(unittest.TestCase):
+    def setUp(self):
+        self.auth = Authenticator(cache_size=2)
+        self.token = hashlib.sha512(
+            ("horns&hoofs" + "h&f" + SALT).encode('utf-8')
+        ).hexdigest()
+
+    def test_user_token(self):
+        self.assertTrue(self.auth.check("horns&hoofs", "h&f", self.token))
+        self.assertTrue(self.auth.check("horns&hoofs", "h&f", self.token))
+        self.assertFalse(self.auth.check("horns&hoofs", "h&f", self.token[:-1]))
+        self.assertFalse(self.auth.check("horns&hoofs", "h&f", None))
+        self.assertEqual(1, self.auth.verified.hits)
+
+    def test_failed_checks_are_not_cached(self):
+        for n in range(5):
+            self.assertFalse(self.auth.check("horns&hoofs", f"h&f{n}", self.token))
+        self.assertFalse(self.auth.check("horns&hoofs", "h&f", "0" * 100000))
+        self.assertEqual(0, len(self.auth.verified))
+        self.assertTrue(self.auth.check("horns&hoofs", "h&f", self.token))
+        self.assertEqual(1, len(self.auth.verified))
+
+    def test_admin_digest_is_recomputed_every_hour(self):
+        def admin_token(hour):
+            return hashlib.sha512(
+                (hour.strftime("%Y%m%d%H") + ADMIN_SALT).encode('utf-8')
+            ).hexdigest()
+
+        first = datetime.datetime(2024, 1, 1, 10, 59, 59)
+        second = datetime.datetime(2024, 1, 1, 11, 0, 0)
+        with mock.patch("src.api_requests.datetime") as mocked_datetime, \
+                mock.patch("src.api_requests.time") as mocked_time:
+            mocked_datetime.timedelta = datetime.timedelta
+            mocked_datetime.datetime.now.return_value = first
+            mocked_time.time.return_value = first.timestamp()
+            self.assertTrue(self.auth.check("", ADMIN_LOGIN, admin_token(first)))
+
+            mocked_datetime.datetime.now.return_value = second
+            mocked_time.time.return_value = second.timestamp()
+            self.assertFalse(self.auth.check("", ADMIN_LOGIN, admin_token(first)))
+            self.assertTrue(self.auth.check("", ADMIN_LOGIN, admin_token(second)))
+
+
+if __name__ == "__main__":
+    unittest.main()
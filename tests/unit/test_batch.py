@@ -0,0 +1,107 @@
+import hashlib
+import io
+import json
+import unittest
+
+from benchmarks.memory_store import InMemoryStore
+from src.api_requests import SALT
+from src.batch import read_lines, ScoringEngine
+from src.cache_keys import score_cache_key
+from src.cache_policy import score_policy
+from src.handlers import OK, BAD_REQUEST, FORBIDDEN, INVALID_REQUEST, INTERNAL_ERROR
+
+
+PHONE_EMAIL = {"phone": "79175002040", "email": "stupnikov@otus.ru"}
+NAMES = {"first_name": "a", "last_name": "b"}
+
+
+def user_request(method, arguments):
+    body = {"account": "horns&hoofs", "login": "h&f", "method": method,
+            "arguments": arguments}
+    identity = body["account"] + body["login"] + SALT
+    body["token"] = hashlib.sha512(identity.encode('utf-8')).hexdigest()
+    return body
+
+
+def score_lines(lines, store, **kwargs):
+    with ScoringEngine(lambda: store, **kwargs) as engine:
+        payload = b"".join(payload for payload, _, _ in engine.score(lines))
+    return [json.loads(line) for line in payload.splitlines()]
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.store = InMemoryStore()
+
+    def test_mixed_requests_keep_order(self):
+        interests = {"client_ids": [1, 2], "date": "20.07.2017"}
+        lines = [
+            json.dumps(user_request("online_score", PHONE_EMAIL)),
+            "not json",
+            json.dumps({"body": user_request("clients_interests", interests)}),
+            json.dumps(dict(user_request("online_score", NAMES), token="bad")),
+            "",
+            json.dumps(user_request("online_score_batch", {"items": [NAMES, {}]})),
+            json.dumps(user_request("online_score", NAMES)),
+        ]
+        source = io.BytesIO("\n".join(lines).encode())
+        results = score_lines(read_lines(source), self.store, processes=0,
+                              chunk_size=2, workers=2)
+
+        self.assertEqual([OK, BAD_REQUEST, OK, FORBIDDEN, OK, OK],
+                         [result["code"] for result in results])
+        self.assertEqual({"score": 3.0}, results[0]["response"])
+        self.assertEqual({"1", "2"}, set(results[2]["response"]))
+        self.assertEqual({"score": 0.5}, results[4]["response"]["scores"][0])
+        self.assertIn("error", results[4]["response"]["scores"][1])
+        self.assertEqual({"score": 0.5}, results[5]["response"])
+
+    def test_interests_without_store_fail_per_request(self):
+        lines = [json.dumps(user_request("clients_interests", {"client_ids": [1]})),
+                 json.dumps(user_request("online_score", PHONE_EMAIL))]
+        results = score_lines(iter(lines), None, processes=0)
+        self.assertEqual([INTERNAL_ERROR, OK], [result["code"] for result in results])
+
+    def test_malformed_body_fails_per_request(self):
+        lines = [json.dumps({"body": [1, 2]}),
+                 json.dumps(user_request("online_score", [])),
+                 json.dumps(user_request("online_score", NAMES))]
+        results = score_lines(iter(lines), self.store, processes=0)
+        self.assertEqual([INVALID_REQUEST, INVALID_REQUEST, OK],
+                         [result["code"] for result in results])
+
+
+def score_line(n):
+    arguments = {"phone": f"7{n:010d}", "email": f"u{n}@otus.ru"}
+    return json.dumps(user_request("online_score", arguments)).encode()
+
+
+class TestScoringEngine(unittest.TestCase):
+    lines = [score_line(n) for n in range(25)] + [b"[]"]
+
+    def test_processes_match_threads(self):
+        with ScoringEngine(InMemoryStore, processes=2, chunk_size=4) as engine:
+            chunks = list(engine.score(iter(self.lines)))
+        with ScoringEngine(InMemoryStore, chunk_size=4) as engine:
+            expected = list(engine.score(iter(self.lines)))
+
+        self.assertEqual(expected, chunks)
+        self.assertEqual(26, sum(count for _, count, _ in chunks))
+        self.assertEqual(1, sum(failed for _, _, failed in chunks))
+        payload = b"".join(payload for payload, _, _ in chunks)
+        self.assertEqual(26, payload.count(b"\n"))
+
+    def test_warm(self):
+        store = InMemoryStore()
+        valid = [NAMES, {"phone": "79175002040", "email": "a@otus.ru"}]
+        identities = [json.dumps(valid[0]).encode(), b'{"phone": "123"}',
+                      json.dumps(valid[1]).encode()]
+        with ScoringEngine(lambda: store, chunk_size=2) as engine:
+            self.assertEqual((2, 1), engine.warm(iter(identities)))
+        cached = [score_policy.decode(store.cache_get(score_cache_key(**fields)))[0]
+                  for fields in valid]
+        self.assertEqual([b"0.5", b"3.0"], cached)
+
+
+if __name__ == "__main__":
+    unittest.main()
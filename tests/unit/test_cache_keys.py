@@ -0,0 +1,78 @@
+import datetime
+import unittest
+
+from benchmarks.memory_store import InMemoryStore
+from src import cache_keys
+from src.cache_keys import score_cache_key, legacy_score_cache_key
+from src.cache_policy import score_policy
+from src.scoring_service import get_score, get_scores_batch
+
+
+class TestScoreCacheKey(unittest.TestCase):
+    def tearDown(self):
+        cache_keys.configure(cache_keys.DEFAULT_NAMESPACE, True)
+
+    def test_fixed_width_and_versioned(self):
+        short = score_cache_key(phone="79175002040")
+        long = score_cache_key(phone="79175002040", email="x" * 200 + "@otus.ru",
+                               birthday=datetime.date(2000, 1, 1), gender=1,
+                               first_name="a" * 100, last_name="b" * 100)
+        self.assertEqual(len(short), len(long))
+        self.assertTrue(short.startswith(f"s{cache_keys.KEY_VERSION}:"))
+        self.assertNotIn("79175002040", short)
+
+    def test_normalized_fields(self):
+        self.assertEqual(score_cache_key(phone=79175002040, email="User@Otus.ru"),
+                         score_cache_key(phone="79175002040", email="user@otus.ru"))
+        self.assertNotEqual(
+            score_cache_key(first_name="a:b"),
+            score_cache_key(first_name="a", last_name="b"),
+        )
+
+    def test_namespace(self):
+        cache_keys.configure("test")
+        self.assertTrue(score_cache_key(phone="79175002040").startswith("test2:"))
+        with self.assertRaises(ValueError):
+            cache_keys.configure("a:b")
+
+    def test_legacy_format(self):
+        self.assertEqual(
+            "uid:79175002040:test@example.com:20000101:1::",
+            legacy_score_cache_key(
+                phone="79175002040",
+                email="test@example.com",
+                birthday=datetime.date(2000, 1, 1),
+                gender=1,
+            ),
+        )
+
+
+class TestLegacyKeyReads(unittest.TestCase):
+    def setUp(self):
+        self.store = InMemoryStore()
+        self.store.cache_set(
+            legacy_score_cache_key(first_name="a", last_name="b"), 7.0, 60
+        )
+
+    def tearDown(self):
+        cache_keys.configure(legacy_key_reads=True)
+
+    def test_legacy_value_is_migrated(self):
+        self.assertEqual(7.0, get_score(self.store, first_name="a", last_name="b"))
+        cached = self.store.cache_get(score_cache_key(first_name="a", last_name="b"))
+        self.assertEqual((b"7.0", False), score_policy.decode(cached))
+
+    def test_batch_legacy_value_is_migrated(self):
+        items = [{"first_name": "a", "last_name": "b"}, {"phone": "79175002040"}]
+        self.assertEqual([7.0, 1.5], get_scores_batch(self.store, items))
+        cached = self.store.cache_get_many([score_cache_key(**item) for item in items])
+        self.assertEqual([(b"7.0", False), (b"1.5", False)],
+                         [score_policy.decode(value) for value in cached])
+
+    def test_legacy_reads_disabled(self):
+        cache_keys.configure(legacy_key_reads=False)
+        self.assertEqual(0.5, get_score(self.store, first_name="a", last_name="b"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+import asyncio
+import unittest
+
+from benchmarks.memory_store import InMemoryStore, AsyncInMemoryStore
+from src import scoring_service
+from src.cache_keys import score_cache_key
+from src.cache_policy import CachePolicy, NegativeCache, score_policy, configure_policy
+from src.scoring_service import get_score, get_score_async, get_scores_batch
+
+
+def wait_refresh():
+    scoring_service._refresher.submit(lambda: None).result()
+
+
+class TestCachePolicy(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.random = 0.5
+        self.policy = CachePolicy(100, jitter=0.2, stale=30, clock=lambda: self.now,
+                                  rng=lambda: self.random)
+
+    def test_entry(self):
+        self.assertEqual(("1.5;1100", 131), self.policy.entry(1.5))
+        self.random = 0.0
+        self.assertEqual(("1.5;1080", 111), self.policy.entry(1.5))
+
+    def test_entries_have_own_ttls(self):
+        mapping, expire = self.policy.entries({"a": 1.5, "b": 3.0})
+        self.assertEqual({"a": "1.5;1100", "b": "3.0;1100"}, mapping)
+        self.assertEqual({"a": 131, "b": 131}, expire)
+
+        randoms = iter([0.0, 1.0])
+        self.policy = CachePolicy(100, jitter=0.2, stale=0, clock=lambda: self.now,
+                                  rng=lambda: next(randoms))
+        mapping, expire = self.policy.entries({"a": 1.5, "b": 3.0})
+        self.assertEqual({"a": "1.5", "b": "3.0"}, mapping)
+        self.assertEqual({"a": 81, "b": 121}, expire)
+
+    def test_decode(self):
+        self.assertEqual((b"1.5", False), self.policy.decode(b"1.5;1100"))
+        self.now = 1100.0
+        self.assertEqual((b"1.5", True), self.policy.decode(b"1.5;1100"))
+        self.assertEqual((b"1.5", False), self.policy.decode(b"1.5"))
+
+    def test_no_stale_window(self):
+        self.policy.configure(stale=0)
+        self.assertEqual(("1.5", 101), self.policy.entry(1.5))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            self.policy.configure(jitter=1)
+        with self.assertRaises(ValueError):
+            self.policy.configure(ttl=0)
+
+    def test_max_value_size(self):
+        self.policy.configure(max_value_size=4)
+        self.assertIsNone(self.policy.entry(1.5))
+        self.assertEqual({}, self.policy.entries({"a": 1.5})[0])
+
+
+class TestConfigurePolicy(unittest.TestCase):
+    def setUp(self):
+        self.options = score_policy.options()
+
+    def tearDown(self):
+        score_policy.configure(**self.options)
+        score_policy.namespace = self.options["namespace"]
+
+    def test_spec(self):
+        configure_policy("online_score:ttl=60,jitter=0,l1=off,max_value_size=64")
+        self.assertEqual((60, 0, False, 64),
+                         (score_policy.ttl, score_policy.jitter, score_policy.l1,
+                          score_policy.max_value_size))
+
+    def test_namespace(self):
+        store = InMemoryStore()
+        configure_policy("online_score:namespace=n")
+        self.assertEqual(0.5, get_score(store, first_name="a", last_name="b"))
+        key = score_cache_key(first_name="a", last_name="b", key_namespace="n")
+        self.assertTrue(key.startswith("n2:"))
+        self.assertIsNotNone(store.cache_get(key))
+        names_key = score_cache_key(first_name="a", last_name="b")
+        self.assertIsNone(store.cache_get(names_key))
+
+    def test_unknown(self):
+        for spec in ("clients:ttl=1", "online_score:size=1", "online_score:l1=maybe",
+                     "online_score:namespace=a:b"):
+            with self.assertRaises(ValueError):
+                configure_policy(spec)
+
+    def test_disabled_skips_store(self):
+        store = InMemoryStore()
+        configure_policy("online_score:enabled=off")
+        self.assertEqual(0.5, get_score(store, first_name="a", last_name="b"))
+        self.assertEqual([1.5], get_scores_batch(store, [{"phone": "79175002040"}]))
+        names_key = score_cache_key(first_name="a", last_name="b")
+        self.assertIsNone(store.cache_get(names_key))
+
+
+class TestNegativeCache(unittest.TestCase):
+    def setUp(self):
+        self.policy = CachePolicy(10, jitter=0, stale=0, max_value_size=16)
+        self.cache = NegativeCache(self.policy)
+
+    def test_keyed_by_path_and_body(self):
+        key = NegativeCache.key("/method", b"{}")
+        self.assertEqual(key, NegativeCache.key("method/", b"{}"))
+        self.assertNotEqual(key, NegativeCache.key("/other", b"{}"))
+        self.cache.add(key, "online_score", b"payload")
+        self.assertEqual(("online_score", b"payload"), self.cache.get(key))
+
+    def test_limits(self):
+        key = NegativeCache.key("/method", b"{}")
+        self.cache.add(key, "online_score", b"x" * 17)
+        self.assertIsNone(self.cache.get(key))
+        self.cache.add(key, "online_score", b"payload")
+        self.policy.configure(enabled=False)
+        self.assertIsNone(self.cache.get(key))
+
+
+class TestStaleWhileRevalidate(unittest.TestCase):
+    def setUp(self):
+        self.store = InMemoryStore()
+        self.fields = {"first_name": "a", "last_name": "b"}
+        self.key = score_cache_key(**self.fields)
+        self.store.cache_set(self.key, "9.0;0", 60)
+
+    def test_stale_score_is_served_and_refreshed(self):
+        self.assertEqual(9.0, get_score(self.store, **self.fields))
+        wait_refresh()
+        cached = self.store.cache_get(self.key)
+        self.assertEqual((b"0.5", False), score_policy.decode(cached))
+        self.assertEqual(0.5, get_score(self.store, **self.fields))
+
+    def test_batch_stale_scores_are_refreshed(self):
+        items = [self.fields, {"phone": "79175002040"}]
+        self.assertEqual([9.0, 1.5], get_scores_batch(self.store, items))
+        wait_refresh()
+        self.assertEqual([0.5, 1.5], get_scores_batch(self.store, items))
+
+    def test_async_refresh(self):
+        store = AsyncInMemoryStore(self.store)
+
+        async def run():
+            score = await get_score_async(store, **self.fields)
+            await asyncio.gather(*scoring_service._refresh_tasks)
+            return score
+
+        self.assertEqual(9.0, asyncio.run(run()))
+        cached = self.store.cache_get(self.key)
+        self.assertEqual((b"0.5", False), score_policy.decode(cached))
+
+
+if __name__ == "__main__":
+    unittest.main()
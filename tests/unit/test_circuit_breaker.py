@@ -0,0 +1,82 @@
+import threading
+import unittest
+
+from src.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.transitions = []
+        self.breaker = CircuitBreaker(
+            failure_threshold=3,
+            recovery_timeout=5,
+            clock=self.clock,
+            on_state_change=lambda name, state: self.transitions.append(state),
+        )
+
+    def test_opens_after_threshold(self):
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.assertEqual(CLOSED, self.breaker.state)
+        self.breaker.record_failure()
+        self.assertEqual(OPEN, self.breaker.state)
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(
+            {"state": OPEN, "failures": 3, "opened": 1, "rejected": 1},
+            self.breaker.stats(),
+        )
+
+    def test_success_resets_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(CLOSED, self.breaker.state)
+
+    def test_half_open_allows_single_trial(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.clock.now = 5
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(HALF_OPEN, self.breaker.state)
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual(CLOSED, self.breaker.state)
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual([OPEN, HALF_OPEN, CLOSED], self.transitions)
+
+    def test_failed_trial_reopens(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.clock.now = 5
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(OPEN, self.breaker.state)
+        self.clock.now = 9
+        self.assertFalse(self.breaker.allow())
+        self.clock.now = 10
+        self.assertTrue(self.breaker.allow())
+
+    def test_probe_closes_breaker(self):
+        healthy = threading.Event()
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=60,
+                                 probe=healthy.is_set, probe_interval=0.01)
+        breaker.record_failure()
+        self.assertEqual(OPEN, breaker.state)
+        healthy.set()
+        breaker._probe_thread.join(1)
+        self.assertEqual(CLOSED, breaker.state)
+        self.assertTrue(breaker.allow())
+
+
+if __name__ == "__main__":
+    unittest.main()
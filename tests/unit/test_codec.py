@@ -0,0 +1,26 @@
+import unittest
+
+from src import codec
+
+
+class TestCodec(unittest.TestCase):
+    def tearDown(self):
+        codec.use("auto")
+
+    def test_backends_roundtrip(self):
+        payload = {"code": 200, "response": {"1": ["cars", "pets"]}, "error": None}
+        for name in codec.available():
+            loads, dumps = codec.get(name)
+            raw = dumps(payload)
+            self.assertIsInstance(raw, bytes, name)
+            self.assertEqual(payload, loads(raw), name)
+
+    def test_fallback_to_stdlib(self):
+        self.assertEqual("json", codec.use("json"))
+        self.assertEqual(b'{"score": 3.0}', codec.dumps({"score": 3.0}))
+        with self.assertRaises(ValueError):
+            codec.loads(b"{bad")
+
+
+if __name__ == "__main__":
+    unittest.main()
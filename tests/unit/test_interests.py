@@ -0,0 +1,56 @@
+import unittest
+
+from benchmarks.memory_store import InMemoryStore
+from src.interests import DEFAULT_INTERESTS, encode_interests, decode_interests, \
+    interests_location, group_fields, group_masks
+from src.scoring_service import get_interests, get_interests_batch
+
+
+class TestInterestsEncoding(unittest.TestCase):
+    def test_roundtrip(self):
+        self.assertEqual(0b101, encode_interests(["travel", "cars"]))
+        self.assertEqual(["cars", "travel"], decode_interests(b"5"))
+        self.assertEqual(
+            DEFAULT_INTERESTS, decode_interests(encode_interests(DEFAULT_INTERESTS))
+        )
+        self.assertEqual([], decode_interests(0))
+
+    def test_unknown_interest(self):
+        with self.assertRaises(ValueError):
+            encode_interests(["cars", "knitting"])
+
+    def test_buckets(self):
+        self.assertEqual(("ib:0", "7"), interests_location(7))
+        self.assertEqual(("ib:12", "34"), interests_location(1234))
+        self.assertEqual(
+            {"ib:0": ["1", "99"], "ib:1": ["0"]}, group_fields([1, 99, 100])
+        )
+        self.assertEqual(
+            {"ib:0": {"1": 3}, "ib:1": {"0": 4}}, group_masks({1: 3, 100: 4})
+        )
+
+
+class TestInterestsStorage(unittest.TestCase):
+    def setUp(self):
+        self.store = InMemoryStore()
+
+    def test_generated_interests_are_stored_as_mask(self):
+        interests = get_interests_batch(self.store, [1, 250])
+        stored = self.store.hget_many({"ib:0": ["1"], "ib:2": ["50"]})
+        self.assertEqual(interests[1], decode_interests(stored["ib:0"][0]))
+        self.assertEqual(interests[250], decode_interests(stored["ib:2"][0]))
+        self.assertEqual(interests, get_interests_batch(self.store, [1, 250]))
+
+    def test_legacy_value_is_migrated(self):
+        self.store.set("i:5", "pets,cars")
+        self.assertEqual(["cars", "pets"], get_interests(self.store, 5))
+        self.assertEqual([b"3"], self.store.hget_many({"ib:0": ["5"]})["ib:0"])
+
+    def test_legacy_value_outside_vocabulary(self):
+        self.store.set("i:5", "knitting")
+        self.assertEqual(["knitting"], get_interests(self.store, 5))
+        self.assertEqual([None], self.store.hget_many({"ib:0": ["5"]})["ib:0"])
+
+
+if __name__ == "__main__":
+    unittest.main()
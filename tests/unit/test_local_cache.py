@@ -0,0 +1,46 @@
+import unittest
+
+from src.local_cache import LocalCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLocalCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = LocalCache(max_size=2, ttl=10, clock=self.clock)
+
+    def test_hit_and_miss_counters(self):
+        self.assertIsNone(self.cache.get("a"))
+        self.cache.set("a", b"1.5")
+        self.assertEqual(b"1.5", self.cache.get("a"))
+        self.assertEqual(
+            {"size": 1, "hits": 1, "misses": 1, "evictions": 0}, self.cache.stats()
+        )
+
+    def test_lru_eviction(self):
+        self.cache.set("a", b"1")
+        self.cache.set("b", b"2")
+        self.cache.get("a")
+        self.cache.set("c", b"3")
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(b"1", self.cache.get("a"))
+        self.assertEqual(1, self.cache.evictions)
+
+    def test_ttl_expiry(self):
+        self.cache.set("a", b"1", expire=5)
+        self.clock.now = 4.9
+        self.assertEqual(b"1", self.cache.get("a"))
+        self.clock.now = 5
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(0, len(self.cache))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import datetime
+import unittest
+
+from src.api_requests import ClientsInterestsRequest, OnlineScoreRequest
+from src.model import CharField, Schema
+
+
+class TestSchema(unittest.TestCase):
+    def test_fields_compiled_at_class_creation(self):
+        self.assertEqual(
+            ("first_name", "last_name", "email", "phone", "birthday", "gender"),
+            tuple(OnlineScoreRequest._fields),
+        )
+        self.assertEqual("phone", OnlineScoreRequest._fields["phone"].field_name)
+
+    def test_slots(self):
+        request = OnlineScoreRequest({"first_name": "a", "last_name": "b"})
+        self.assertFalse(hasattr(request, "__dict__"))
+        self.assertIsNone(request.phone)
+
+    def test_required_field(self):
+        class LoginRequest(Schema):
+            login = CharField(required=True, nullable=True)
+
+        self.assertIsNone(LoginRequest({"login": None}).login)
+        with self.assertRaises(ValueError):
+            LoginRequest({})
+
+    def test_date_parsing(self):
+        self.assertEqual(
+            datetime.date(2017, 7, 1),
+            ClientsInterestsRequest({"client_ids": [1], "date": "1.07.2017"}).date,
+        )
+        with self.assertRaises(ValueError):
+            ClientsInterestsRequest({"client_ids": [1], "date": "31.02.2017"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import datetime
+import itertools
+import sys
+import unittest
+from unittest import mock
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from src.scoring_service import compute_score, compute_scores, compute_scores_batch, \
+    score_columns, SCORE_FIELDS
+
+VALUES = {
+    "phone": [None, "", "79175002040", 79175002040],
+    "email": [None, "", "stupnikov@otus.ru"],
+    "birthday": [None, datetime.date(2000, 1, 1)],
+    "gender": [None, 0, 1, 2],
+    "first_name": [None, "", "a"],
+    "last_name": [None, "", "b"],
+}
+ITEMS = [
+    dict(zip(VALUES, combination))
+    for combination in itertools.product(*VALUES.values())
+]
+EXPECTED = [compute_score(**fields) for fields in ITEMS]
+
+
+class TestVectorizedScores(unittest.TestCase):
+    def test_batch_matches_get_score(self):
+        self.assertEqual(EXPECTED, compute_scores_batch(ITEMS))
+
+    def test_columns_match_get_score(self):
+        self.assertEqual(EXPECTED, compute_scores(**score_columns(ITEMS)))
+
+    def test_without_numpy(self):
+        columns = score_columns(ITEMS)
+        with mock.patch.dict(sys.modules, {"numpy": None}):
+            self.assertEqual(EXPECTED, compute_scores(**columns))
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_numpy_presence_masks(self):
+        masks = {
+            field: numpy.array([bool(fields[field]) for fields in ITEMS])
+            for field in SCORE_FIELDS
+        }
+        self.assertEqual(EXPECTED, compute_scores(**masks))
+
+    def test_empty(self):
+        self.assertEqual([], compute_scores_batch([]))
+        self.assertEqual([], compute_scores(*([[]] * len(SCORE_FIELDS))))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,392 @@
+import asyncio
+import hashlib
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from http.client import HTTPConnection
+from unittest import mock
+
+from benchmarks.memory_store import InMemoryStore, AsyncInMemoryStore
+from src.admission import DeadlineExceeded
+from src.api_requests import SALT
+from src.cache_keys import score_cache_key
+from src.cache_policy import invalid_requests, score_policy
+from src.handlers import MainHTTPHandler, OK, PAYLOAD_TOO_LARGE, INVALID_REQUEST, \
+    SERVICE_UNAVAILABLE, DEADLINE_EXCEEDED, STREAM_THRESHOLD, method_handler, \
+    validate_method_request, preload
+from src.async_server import AsyncHTTPServer
+from src.server import ThreadPoolHTTPServer, make_server
+
+
+def interests_request(client_ids):
+    body = {"account": "horns&hoofs", "login": "h&f", "method": "clients_interests",
+            "arguments": {"client_ids": client_ids}}
+    identity = body["account"] + body["login"] + SALT
+    body["token"] = hashlib.sha512(identity.encode('utf-8')).hexdigest()
+    return body
+
+
+class TestThreadPoolServer(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadPoolHTTPServer(("127.0.0.1", 0), MainHTTPHandler, threads=4)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        invalid_requests.clear()
+
+    def post(self, body):
+        conn = HTTPConnection(*self.server.server_address, timeout=5)
+        conn.request("POST", "/method", json.dumps({"body": body}))
+        response = json.loads(conn.getresponse().read())
+        conn.close()
+        return response
+
+    def test_concurrent_score_requests(self):
+        body = {"account": "horns&hoofs", "login": "h&f", "method": "online_score",
+                "arguments": {"phone": "79175002040", "email": "stupnikov@otus.ru"}}
+        body["token"] = hashlib.sha512(
+            (body["account"] + body["login"] + SALT).encode('utf-8')
+        ).hexdigest()
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.post(body)))
+            for _ in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(8, len(results))
+        self.assertTrue(
+            all(r["code"] == OK and r["response"]["score"] == 3.0 for r in results)
+        )
+
+    def test_keep_alive(self):
+        body = json.dumps({"body": {}})
+        conn = HTTPConnection(*self.server.server_address, timeout=5)
+        for _ in range(3):
+            conn.request("POST", "/method", body)
+            response = conn.getresponse()
+            self.assertEqual(
+                len(response.read()), int(response.getheader("Content-Length"))
+            )
+            self.assertIsNone(response.getheader("Connection"))
+        sock = conn.sock
+        conn.request("POST", "/method", body)
+        conn.getresponse().read()
+        self.assertIs(sock, conn.sock)
+        conn.close()
+
+    def test_idle_keep_alive_connections_do_not_block_workers(self):
+        idle = []
+        for _ in range(self.server.threads):
+            conn = HTTPConnection(*self.server.server_address, timeout=5)
+            conn.request("POST", "/method", json.dumps({"body": {}}))
+            conn.getresponse().read()
+            idle.append(conn)
+
+        started = time.monotonic()
+        self.post({})
+        self.assertLess(time.monotonic() - started, 2)
+        for conn in idle:
+            conn.close()
+
+    def test_request_limit_closes_connection(self):
+        limit = MainHTTPHandler.max_requests_per_connection
+        MainHTTPHandler.max_requests_per_connection = 2
+        try:
+            conn = HTTPConnection(*self.server.server_address, timeout=5)
+            for expected in (None, "close"):
+                conn.request("POST", "/method", json.dumps({"body": {}}))
+                response = conn.getresponse()
+                response.read()
+                self.assertEqual(expected, response.getheader("Connection"))
+            conn.close()
+        finally:
+            MainHTTPHandler.max_requests_per_connection = limit
+
+    def test_metrics_endpoint(self):
+        self.post({"account": "horns&hoofs", "login": "h&f", "method": "online_score",
+                   "token": "bad"})
+
+        conn = HTTPConnection(*self.server.server_address, timeout=5)
+        conn.request("GET", "/metrics")
+        response = conn.getresponse()
+        text = response.read().decode()
+        conn.close()
+
+        self.assertEqual(OK, response.status)
+        self.assertIn("# TYPE scoring_request_stage_seconds histogram", text)
+        self.assertIn(
+            'scoring_request_stage_seconds_count{stage="auth",method="online_score"}',
+            text,
+        )
+        self.assertIn('scoring_requests_total{method="online_score",code="403"}', text)
+
+    def test_body_too_large(self):
+        max_body_size = MainHTTPHandler.max_body_size
+        MainHTTPHandler.max_body_size = 16
+        try:
+            conn = HTTPConnection(*self.server.server_address, timeout=5)
+            conn.request(
+                "POST", "/method", json.dumps({"body": {"method": "online_score"}})
+            )
+            response = conn.getresponse()
+            self.assertEqual(PAYLOAD_TOO_LARGE, json.loads(response.read())["code"])
+            self.assertEqual("close", response.getheader("Connection"))
+            conn.close()
+        finally:
+            MainHTTPHandler.max_body_size = max_body_size
+
+    def test_streamed_interests(self):
+        body = interests_request(list(range(1200)) + [0])
+        MainHTTPHandler.store, MainHTTPHandler.stream_threshold = InMemoryStore(), 5
+        try:
+            conn = HTTPConnection(*self.server.server_address, timeout=5)
+            for _ in range(2):
+                conn.request("POST", "/method", json.dumps({"body": body}))
+                response = conn.getresponse()
+                self.assertEqual("chunked", response.getheader("Transfer-Encoding"))
+                result = json.loads(response.read())
+                self.assertEqual(OK, result["code"])
+                self.assertEqual([str(cid) for cid in range(1200)],
+                                 list(result["response"]))
+            conn.close()
+        finally:
+            MainHTTPHandler.store = None
+            MainHTTPHandler.stream_threshold = STREAM_THRESHOLD
+
+    def test_invalid_request_is_cached(self):
+        body = {"account": "horns&hoofs", "login": "h&f", "method": "online_score",
+                "arguments": {"phone": "123", "email": "stupnikov@otus.ru"}}
+        identity = body["account"] + body["login"] + SALT
+        body["token"] = hashlib.sha512(identity.encode('utf-8')).hexdigest()
+        with mock.patch("src.handlers.validate_method_request",
+                        wraps=validate_method_request) as validate:
+            responses = [self.post(body) for _ in range(3)]
+        self.assertEqual(1, validate.call_count)
+        self.assertEqual([INVALID_REQUEST] * 3, [r["code"] for r in responses])
+        self.assertEqual(responses[0], responses[2])
+
+
+class TestSerialServer(unittest.TestCase):
+    def test_idle_keep_alive_connection_is_released(self):
+        server = make_server("127.0.0.1", 0, MainHTTPHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            idle = HTTPConnection(*server.server_address, timeout=5)
+            idle.request("POST", "/method", json.dumps({"body": {}}))
+            idle.getresponse().read()
+
+            started = time.monotonic()
+            conn = HTTPConnection(*server.server_address, timeout=5)
+            conn.request("POST", "/method", json.dumps({"body": {}}))
+            self.assertEqual(
+                INVALID_REQUEST, json.loads(conn.getresponse().read())["code"]
+            )
+            self.assertLess(time.monotonic() - started, 2)
+            conn.close()
+            idle.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class TestPreload(unittest.TestCase):
+    def test_preload_warms_score_cache(self):
+        store = InMemoryStore()
+        with tempfile.NamedTemporaryFile("wb", suffix=".jsonl", delete=False) as source:
+            source.write(b'{"first_name": "a", "last_name": "b"}\n{"phone": "123"}\n')
+        try:
+            preload(store, source.name)
+        finally:
+            os.unlink(source.name)
+        key = score_cache_key(first_name="a", last_name="b")
+        self.assertEqual(b"0.5", score_policy.decode(store.cache_get(key))[0])
+
+
+class TestAdmissionControl(unittest.TestCase):
+    def test_rejects_above_max_in_flight(self):
+        server = ThreadPoolHTTPServer(
+            ("127.0.0.1", 0), MainHTTPHandler, threads=1, max_in_flight=1
+        )
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        busy = socket.create_connection(server.server_address, timeout=5)
+        busy.sendall(b"POST /method HTTP/1.1\r\nContent-Length: 10\r\n\r\n{")
+        try:
+            with socket.create_connection(server.server_address, timeout=5) as sock:
+                reply = sock.makefile("rb").read()
+            self.assertTrue(reply.startswith(b"HTTP/1.1 503 "))
+            self.assertEqual(
+                SERVICE_UNAVAILABLE, json.loads(reply.split(b"\r\n\r\n", 1)[1])["code"]
+            )
+            self.assertEqual(1, server.limiter.rejected)
+        finally:
+            busy.close()
+            server.shutdown()
+            server.server_close()
+
+    def test_idle_connections_are_not_in_flight(self):
+        server = ThreadPoolHTTPServer(
+            ("127.0.0.1", 0), MainHTTPHandler, threads=2, max_in_flight=1
+        )
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            idle = HTTPConnection(*server.server_address, timeout=5)
+            idle.request("POST", "/method", json.dumps({"body": {}}))
+            idle.getresponse().read()
+            while server.limiter.in_flight:
+                time.sleep(0.01)
+            conn = HTTPConnection(*server.server_address, timeout=5)
+            conn.request("POST", "/method", json.dumps({"body": {}}))
+            self.assertEqual(
+                INVALID_REQUEST, json.loads(conn.getresponse().read())["code"]
+            )
+            self.assertEqual(0, server.limiter.rejected)
+            conn.close()
+            idle.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_expired_deadline_is_dropped(self):
+        body = {"account": "horns&hoofs", "login": "h&f", "method": "online_score",
+                "arguments": {"phone": "79175002040", "email": "stupnikov@otus.ru"}}
+        body["token"] = hashlib.sha512(
+            (body["account"] + body["login"] + SALT).encode('utf-8')
+        ).hexdigest()
+        response, code = method_handler(
+            {"body": body, "headers": {}}, {"deadline": 0}, None
+        )
+        self.assertEqual(DEADLINE_EXCEEDED, code)
+
+    def test_deadline_reached_in_store_is_dropped(self):
+        class ExpiringStore(InMemoryStore):
+            def hget_many(self, fields):
+                raise DeadlineExceeded("Request deadline exceeded")
+
+        store = ExpiringStore()
+        response, code = method_handler(
+            {"body": interests_request([1, 2]), "headers": {}}, {}, store
+        )
+        self.assertEqual(DEADLINE_EXCEEDED, code)
+
+
+class TestAsyncServer(unittest.TestCase):
+    def test_keep_alive_score_requests(self):
+        body = {"account": "horns&hoofs", "login": "h&f", "method": "online_score",
+                "arguments": {"first_name": "a", "last_name": "b"}}
+        body["token"] = hashlib.sha512(
+            (body["account"] + body["login"] + SALT).encode('utf-8')
+        ).hexdigest()
+        payload = json.dumps({"body": body}).encode('utf-8')
+
+        async def run():
+            server = await asyncio.start_server(
+                AsyncHTTPServer(None).handle_connection, "127.0.0.1", 0
+            )
+            reader, writer = await asyncio.open_connection(
+                *server.sockets[0].getsockname()
+            )
+            responses = []
+            for _ in range(3):
+                writer.write(
+                    b"POST /method HTTP/1.1\r\nContent-Length: %d\r\n\r\n"
+                    % len(payload)
+                    + payload
+                )
+                await writer.drain()
+                await reader.readline()
+                headers = {}
+                while (line := await reader.readline()) != b"\r\n":
+                    name, _, value = line.decode().partition(":")
+                    headers[name.lower()] = value.strip()
+                responses.append(
+                    json.loads(await reader.readexactly(int(headers["content-length"])))
+                )
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return responses
+
+        responses = asyncio.run(run())
+        self.assertTrue(
+            all(r["code"] == OK and r["response"]["score"] == 0.5 for r in responses)
+        )
+
+    def test_trickled_request_times_out(self):
+        async def run():
+            server = await asyncio.start_server(
+                AsyncHTTPServer(None, idle_timeout=0.2).handle_connection,
+                "127.0.0.1",
+                0,
+            )
+            reader, writer = await asyncio.open_connection(
+                *server.sockets[0].getsockname()
+            )
+            writer.write(b"POST /method HTTP/1.1\r\nContent-Length: 10\r\n")
+            await writer.drain()
+            for _ in range(3):
+                await asyncio.sleep(0.1)
+                writer.write(b"X-Slow: 1\r\n")
+            try:
+                closed = await asyncio.wait_for(reader.read(), 2)
+            except ConnectionError:
+                # the server may close before the last header is sent
+                closed = b""
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return closed
+
+        self.assertEqual(b"", asyncio.run(run()))
+
+    def test_streamed_interests(self):
+        body = interests_request(list(range(1200)))
+        payload = json.dumps({"body": body}).encode('utf-8')
+
+        async def run():
+            handler = AsyncHTTPServer(AsyncInMemoryStore(), stream_threshold=5)
+            server = await asyncio.start_server(
+                handler.handle_connection, "127.0.0.1", 0
+            )
+            reader, writer = await asyncio.open_connection(
+                *server.sockets[0].getsockname()
+            )
+            head = b"POST /method HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % len(payload)
+            writer.write(head + payload)
+            await writer.drain()
+            await reader.readline()
+            headers = {}
+            while (line := await reader.readline()) != b"\r\n":
+                name, _, value = line.decode().partition(":")
+                headers[name.lower()] = value.strip()
+            chunks = []
+            while size := int(await reader.readline(), 16):
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            await reader.readline()
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return headers, chunks
+
+        headers, chunks = asyncio.run(run())
+        self.assertEqual("chunked", headers["transfer-encoding"])
+        self.assertEqual(4, len(chunks))
+        result = json.loads(b"".join(chunks))
+        self.assertEqual(OK, result["code"])
+        self.assertEqual(1200, len(result["response"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
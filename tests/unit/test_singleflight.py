@@ -0,0 +1,158 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from benchmarks.memory_store import InMemoryStore
+from src.admission import DeadlineExceeded, check_deadline, deadline_scope
+from src.interests import decode_interests
+from src.scoring_service import get_interests, get_interests_batch
+from src.singleflight import SingleFlight, AsyncSingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.05)
+            return 42
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(flight.do("key", compute)))
+            for _ in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual([42] * 8, results)
+        self.assertEqual(1, len(calls))
+
+    def test_errors_are_shared_and_not_cached(self):
+        flight = SingleFlight()
+        with self.assertRaises(RuntimeError):
+            flight.do("key", lambda: (_ for _ in ()).throw(RuntimeError("boom")))
+        self.assertEqual(1, flight.do("key", lambda: 1))
+
+    def test_do_many_computes_only_owned_keys(self):
+        flight = SingleFlight()
+        computed = []
+
+        def load(keys):
+            computed.append(sorted(keys))
+            time.sleep(0.05)
+            return {key: key * 10 for key in keys}
+
+        results = {}
+        first = threading.Thread(
+            target=lambda: results.update(flight.do_many([1, 2], load))
+        )
+        first.start()
+        time.sleep(0.01)
+        results.update(flight.do_many([2, 3], load))
+        first.join()
+
+        self.assertEqual({1: 10, 2: 20, 3: 30}, results)
+        self.assertEqual([[1, 2], [3]], computed)
+
+    def test_async_do(self):
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "value"
+
+        async def run():
+            return await asyncio.gather(*(flight.do("key", compute) for _ in range(5)))
+
+        self.assertEqual(["value"] * 5, asyncio.run(run()))
+        self.assertEqual(1, len(calls))
+
+    def test_async_follower_outlives_cancelled_leader(self):
+        flight = AsyncSingleFlight()
+
+        async def compute():
+            await asyncio.sleep(0.05)
+            return "value"
+
+        async def compute_many(owned):
+            await asyncio.sleep(0.05)
+            return {key: "value" for key in owned}
+
+        async def run():
+            leader = asyncio.create_task(flight.do("key", compute))
+            batch_leader = asyncio.create_task(flight.do_many([1, 2], compute_many))
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(flight.do("key", compute))
+            batch_follower = asyncio.create_task(flight.do_many([2, 3], compute_many))
+            await asyncio.sleep(0)
+            leader.cancel()
+            batch_leader.cancel()
+            return await follower, await batch_follower
+
+        self.assertEqual(("value", {2: "value", 3: "value"}), asyncio.run(run()))
+
+
+class TestCoalescedInterests(unittest.TestCase):
+    def test_concurrent_misses_store_one_sample(self):
+        store = InMemoryStore(latency=0.01)
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(get_interests(store, 7)))
+            for _ in range(4)
+        ]
+
+        def batch():
+            results.append(get_interests_batch(store, [7, 8])[7])
+
+        threads.append(threading.Thread(target=batch))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        stored = decode_interests(store.hget_many({"ib:0": ["7"]})["ib:0"][0])
+        self.assertTrue(all(result == stored for result in results))
+
+    def test_follower_outlives_expired_leader(self):
+        started, release = threading.Event(), threading.Event()
+
+        class SlowStore(InMemoryStore):
+            def hget_many(self, fields):
+                started.set()
+                release.wait(5)
+                check_deadline()
+                return super().hget_many(fields)
+
+        store = SlowStore()
+        errors = []
+
+        def leader():
+            with deadline_scope({"deadline": 0}):
+                try:
+                    get_interests_batch(store, [7])
+                except DeadlineExceeded as e:
+                    errors.append(e)
+
+        thread = threading.Thread(target=leader)
+        thread.start()
+        started.wait(5)
+        threading.Timer(0.05, release.set).start()
+        interests = get_interests_batch(store, [7])[7]
+        thread.join()
+
+        self.assertEqual(1, len(errors))
+        self.assertEqual(
+            interests, decode_interests(store.hget_many({"ib:0": ["7"]})["ib:0"][0])
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
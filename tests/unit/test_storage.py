@@ -0,0 +1,104 @@
+import time
+import unittest
+from unittest import mock
+
+from src.cache_keys import score_cache_key
+from src.cache_policy import score_policy
+from src.scoring_service import get_interests_batch, get_scores_batch
+from src.storage import StoreProtocol, MemoryStore, HashRing, ShardedStore, \
+    parse_node, default_redis_nodes
+from src.store import Store
+
+
+class TestMemoryStore(unittest.TestCase):
+    def setUp(self):
+        self.store = MemoryStore(shards=4)
+
+    def test_implements_protocol(self):
+        self.assertIsInstance(self.store, StoreProtocol)
+        self.assertIsInstance(Store(), StoreProtocol)
+
+    def test_bulk_operations(self):
+        self.store.set_many({f"k{i}": i for i in range(20)})
+        keys = [f"k{i}" for i in range(20)] + ["missing"]
+        self.assertEqual([str(i).encode() for i in range(20)] + [None],
+                         self.store.get_many(keys))
+        self.store.hset_many({"h1": {"a": 1}, "h2": {"b": 2}})
+        self.assertEqual({"h1": [b"1", None], "h2": [b"2"]},
+                         self.store.hget_many({"h1": ["a", "b"], "h2": ["b"]}))
+
+    def later(self, seconds):
+        return mock.patch("src.storage.time.monotonic",
+                          return_value=time.monotonic() + seconds)
+
+    def test_expiry(self):
+        self.store.cache_set("uid", 1.5, 10)
+        self.assertEqual(b"1.5", self.store.cache_get("uid"))
+        with self.later(11):
+            self.assertIsNone(self.store.cache_get("uid"))
+
+    def test_per_key_expiry(self):
+        self.store.cache_set_many({"a": 1, "b": 2}, {"a": 10, "b": 1000})
+        with self.later(11):
+            self.assertEqual([None, b"2"], self.store.cache_get_many(["a", "b"]))
+
+
+class TestHashRing(unittest.TestCase):
+    def test_balanced_and_stable(self):
+        keys = [f"i:{cid}" for cid in range(10000)]
+        ring = HashRing(["a", "b", "c"])
+        owners = [ring.node_for(key) for key in keys]
+        for name in "abc":
+            self.assertGreater(owners.count(name), 2500)
+
+        grown = HashRing(["a", "b", "c", "d"])
+        moved = sum(owner != grown.node_for(key) for owner, key in zip(owners, keys))
+        self.assertTrue(all(grown.node_for(key) == "d"
+                            for owner, key in zip(owners, keys)
+                            if owner != grown.node_for(key)))
+        self.assertLess(moved, 3500)
+
+    def test_parse_node(self):
+        self.assertEqual(("localhost", 6379, 0), parse_node("localhost"))
+        self.assertEqual(("10.0.0.1", 6380, 2), parse_node("10.0.0.1:6380/2"))
+
+    def test_default_redis_nodes(self):
+        environ = {"REDIS_HOST": "redis", "REDIS_DB": "3"}
+        with mock.patch.dict("os.environ", environ, clear=True):
+            self.assertEqual("redis:6379/3", default_redis_nodes())
+        environ = {"SCORING_REDIS_NODES": "a:1,b:2", "REDIS_HOST": "redis"}
+        with mock.patch.dict("os.environ", environ, clear=True):
+            self.assertEqual("a:1,b:2", default_redis_nodes())
+
+
+class TestShardedStore(unittest.TestCase):
+    def setUp(self):
+        self.nodes = [MemoryStore(name=name) for name in ("a", "b", "c")]
+        self.store = ShardedStore(self.nodes)
+
+    def test_keys_are_spread(self):
+        keys = [f"k{i}" for i in range(300)]
+        self.store.set_many({key: i for i, key in enumerate(keys)})
+        self.assertEqual([str(i).encode() for i in range(300)],
+                         self.store.get_many(keys))
+        for node in self.nodes:
+            stored = sum(value is not None for value in node.get_many(keys))
+            self.assertGreater(stored, 50)
+
+    def test_scoring_through_shards(self):
+        items = [{"phone": f"7{n:010d}", "email": "a@otus.ru"} for n in range(50)]
+        self.assertEqual([3.0] * 50, get_scores_batch(self.store, items))
+        cached = self.store.cache_get_many([score_cache_key(**item) for item in items])
+        self.assertEqual([b"3.0"] * 50,
+                         [score_policy.decode(value)[0] for value in cached])
+
+        interests = get_interests_batch(self.store, list(range(1000)))
+        self.assertEqual(interests, get_interests_batch(self.store, list(range(1000))))
+
+    def test_unique_node_names(self):
+        with self.assertRaises(ValueError):
+            ShardedStore([MemoryStore(), MemoryStore()])
+
+
+if __name__ == "__main__":
+    unittest.main()
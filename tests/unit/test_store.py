@@ -0,0 +1,61 @@
+import socket
+import unittest
+
+from src.admission import DeadlineExceeded, deadline_scope
+from src.circuit_breaker import OPEN
+from src.scoring_service import get_interests_batch, get_scores_batch
+from src.store import Store
+
+
+def unused_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestStoreWithoutRedis(unittest.TestCase):
+    def setUp(self):
+        self.store = Store(
+            host="127.0.0.1", port=unused_port(), reconnect_delay=0, max_connections=4
+        )
+
+    def test_lazy_connect(self):
+        self.assertEqual({"max_connections": 4, "created": 0, "in_use": 0, "idle": 0},
+                         self.store.pool_stats())
+
+    def test_operations_degrade(self):
+        self.assertFalse(self.store.ping())
+        self.assertIsNone(self.store.get("i:1"))
+        self.assertIsNone(self.store.cache_get("uid:1"))
+        self.assertFalse(self.store.cache_set("uid:1", 1.5, 60))
+        self.assertEqual([None, None], self.store.get_many(["i:1", "i:2"]))
+        self.assertEqual(0, self.store.pool_stats()["in_use"])
+
+    def test_breaker_fails_fast(self):
+        store = Store(
+            host="127.0.0.1", port=unused_port(), reconnect_delay=0, breaker_threshold=2
+        )
+        self.assertIsNone(store.get("i:1"))
+        self.assertEqual(OPEN, store.breaker_stats()["state"])
+        self.assertIsNone(store.cache_get("uid:1"))
+        self.assertEqual(1, store.breaker_stats()["rejected"])
+        self.assertEqual(0, store.pool_stats()["in_use"])
+
+    def test_expired_deadline_skips_redis(self):
+        with deadline_scope({"deadline": 0}):
+            with self.assertRaises(DeadlineExceeded):
+                self.store.get("i:1")
+            with self.assertRaises(DeadlineExceeded):
+                self.store.cache_set("uid:1", 1.5, 60)
+            # an expired request is not a miss:
+            # no random interests are made up for existing clients
+            with self.assertRaises(DeadlineExceeded):
+                get_interests_batch(self.store, [1, 2])
+            with self.assertRaises(DeadlineExceeded):
+                get_scores_batch(self.store, [{"phone": "79175002040"}])
+        self.assertEqual(0, self.store.pool_stats()["created"])
+        self.assertEqual(0, self.store.breaker_stats()["failures"])
+
+
+if __name__ == "__main__":
+    unittest.main()